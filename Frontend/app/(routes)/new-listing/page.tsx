@@ -25,6 +25,7 @@ const NewListing = () => {
   const [quantity, setQuantity] = useState("");
   const [unit, setUnit] = useState("litre");
   const [image, setImage] = useState(null);
+  const [imageFile, setImageFile] = useState<File | null>(null);
   const [location, setLocation] = useState<any>(null);
   const [errors, setErrors] = useState({
     title: false,
@@ -35,21 +36,13 @@ const NewListing = () => {
     location: false,
   });
 
-  // Convert image to Base64 format
-  const convertToBase64 = (file: File) => {
-    return new Promise<string>((resolve, reject) => {
-      const reader = new FileReader();
-      reader.onloadend = () => resolve(reader.result as string);
-      reader.onerror = reject;
-      reader.readAsDataURL(file);
-    });
-  };
-
-  const handleImageChange = async (event: any) => {
+  // The file is uploaded as multipart form data; `image` only holds its preview URL
+  const handleImageChange = (event: any) => {
     const file = event.target.files?.[0];
     if (file) {
-      const base64Image: any = await convertToBase64(file);
-      setImage(base64Image);
+      if (image) URL.revokeObjectURL(image);
+      setImageFile(file);
+      setImage(URL.createObjectURL(file) as any);
     }
   };
 
@@ -71,19 +64,20 @@ const NewListing = () => {
       return;
     }
 
-    const payload = {
-      title: title,
-      description: description,
-      lat: location.lat,
-      lng: location.lng,
-      location: location.name,
-      category: category,
-      quantity: quantity,
-      unit: unit,
-      price: price,
-      product_status: "listed",
-      image: image,
-    };
+    const payload = new FormData();
+    payload.append("title", title);
+    payload.append("description", description);
+    payload.append("lat", location.lat);
+    payload.append("lng", location.lng);
+    payload.append("location", location.name);
+    payload.append("category", category);
+    payload.append("quantity", quantity);
+    payload.append("unit", unit);
+    payload.append("price", price);
+    payload.append("product_status", "listed");
+    if (imageFile) {
+      payload.append("image", imageFile);
+    }
 
     setLoading(true);
 
@@ -2,6 +2,7 @@
 
 import { useEffect, useState } from "react";
 import Image from "next/image";
+import { thumbnailSrc } from "@/app/utils/images";
 import { toast } from "react-hot-toast";
 import { Plus } from "lucide-react";
 import Link from "next/link";
@@ -113,7 +114,7 @@ const SalesOrder = () => {
               <div className="w-full flex items-center space-x-4">
                 <div className="w-24 h-24">
                   <Image
-                    src={product.image}
+                    src={thumbnailSrc(product)}
                     alt="Product_Image"
                     width={100}
                     height={100}
@@ -171,7 +172,7 @@ const SalesOrder = () => {
             <div className="hidden md:flex bg-white py-2.5 font-semibold px-5 rounded-xl mt-5 justify-between items-center">
               <div className="w-24 h-24">
                 <Image
-                  src={product.image}
+                  src={thumbnailSrc(product)}
                   alt="Product_Image"
                   width={100}
                   height={100}
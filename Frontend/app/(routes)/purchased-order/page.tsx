@@ -2,6 +2,7 @@
 
 import { useEffect, useState } from "react";
 import Image from "next/image";
+import { thumbnailSrc } from "@/app/utils/images";
 import { toast } from "react-hot-toast";
 import ConfirmationModal from "@/app/components/Cards/ConfirmModal";
 
@@ -144,7 +145,7 @@ const PurchaseOrder = () => {
               <div className="w-full flex items-center space-x-4">
                 <div className="w-24 h-24">
                   <Image
-                    src={order.product.image}
+                    src={thumbnailSrc(order.product)}
                     alt="Product_Image"
                     width={100}
                     height={100}
@@ -215,7 +216,7 @@ const PurchaseOrder = () => {
             <div className="hidden md:flex bg-white py-2.5 px-5 rounded-xl justify-between items-center">
               <div className="w-24 h-24">
                 <Image
-                  src={order.product.image}
+                  src={thumbnailSrc(order.product)}
                   alt="Product_Image"
                   width={100}
                   height={100}
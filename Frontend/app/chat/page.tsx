@@ -90,30 +90,20 @@ const ChatPage = () => {
     }
   };
 
-  const getLatestMessage = async () => {
-    axios
-      .post(
-        `${BACKEND_URL}/api/conversations/latest_messages`,
-        {
-          conversation_id: selectedConversation.id,
+  // Long-poll: the backend parks the request until a new message arrives or the timeout passes
+  const waitForLatestMessages = async (conversationId: number) => {
+    const response = await axios.get(
+      `${BACKEND_URL}/api/conversations/latest_messages/wait`,
+      {
+        params: { conversation_id: conversationId },
+        headers: {
+          Authorization: `Bearer ${token}`,
         },
-        {
-          headers: {
-            Authorization: `Bearer ${token}`,
-          },
-        }
-      )
-      .then((response: any) => {
-        if (response.data.data.length > 0) {
-          setMessages((prevState) => [...prevState, ...response.data.data]);
-        }
-      })
-      .catch((error: any) => {
-        console.error("Error fetching conversations:", error.message);
-        toast.error(error.message || "Failed to load conversations", {
-          position: "bottom-right",
-        });
-      });
+      }
+    );
+    if (response.data.data.length > 0) {
+      setMessages((prevState) => [...prevState, ...response.data.data]);
+    }
   };
 
   useEffect(() => {
@@ -136,9 +126,22 @@ const ChatPage = () => {
         .catch((err) => {
           console.log(err);
         });
-      setInterval(() => {
-        getLatestMessage();
-      }, 5000);
+      let cancelled = false;
+      const pollLatestMessages = async () => {
+        while (!cancelled) {
+          try {
+            await waitForLatestMessages(selectedConversation.id);
+          } catch (error: any) {
+            console.error("Error fetching latest messages:", error.message);
+            // Back off before retrying after a failed poll
+            await new Promise((resolve) => setTimeout(resolve, 5000));
+          }
+        }
+      };
+      pollLatestMessages();
+      return () => {
+        cancelled = true;
+      };
     }
     return;
   }, [selectedConversation]);
@@ -1,4 +1,5 @@
 import Image from "next/image";
+import { thumbnailSrc } from "@/app/utils/images";
 
 const parseStyledText = (text: string) => {
   const regex = /(\*\*\*.*?\*\*\*|\*\*.*?\*\*|\*.*?\*)/g; // Match ***...***, **...**, and *...*
@@ -37,7 +38,7 @@ const ProductCard = ({ product }: any) => {
     <div className="rounded-lg border shadow-lg">
       <div className="w-full">
         <Image
-          src={product.image}
+          src={thumbnailSrc(product)}
           alt={product.title}
           width={100}
           height={280}
@@ -0,0 +1,12 @@
+export interface ImageVariant {
+  webp: string;
+  jpeg: string;
+  width: number;
+  height: number;
+}
+
+// Variants are generated in the background after an upload; until then only the original exists
+export const thumbnailSrc = (
+  product: { image?: string; image_variants?: Record<string, ImageVariant> | null },
+  size = "thumb"
+) => product?.image_variants?.[size]?.webp ?? product?.image ?? "";
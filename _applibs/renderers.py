@@ -0,0 +1,41 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Drop-in JSONRenderer that encodes with orjson when it is installed.
+
+    The whole echo() envelope is encoded in a single pass straight to bytes; datetimes
+    are encoded natively (UTC as "Z", like DRF) and Decimals, lazy strings and the other
+    types DRF knows about go through DRF's own encoder hook, so the output matches
+    JSONRenderer. Indented output (browsable API), values orjson rejects and a missing
+    orjson fall back to JSONRenderer.
+    """
+    options = orjson.OPT_UTC_Z if orjson else 0
+
+    def __init__(self):
+        self._default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self._default, option=self.options)
+        except TypeError:
+            # e.g. integers wider than 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Escape \u2028 and \u2029 like JSONRenderer, keeping the output a strict JavaScript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -1,4 +1,6 @@
 from typing import Optional
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
 from rest_framework.response import Response
 
 
@@ -27,3 +29,11 @@ def echo(status: int, msg: str, data: Optional[dict] = None):
     if data is not None:
         res_data['data'] = data
     return Response(data=res_data, status=status)
+
+
+def echo_json(status: int, msg: str, data: Optional[dict] = None):
+    """echo() for plain Django views, which cannot render DRF responses."""
+    res_data = {'message': msg}
+    if data is not None:
+        res_data['data'] = data
+    return JsonResponse(res_data, status=status, encoder=DjangoJSONEncoder, safe=False)
@@ -1,6 +1,24 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
+def running_management_command():
+    """Whether this process runs a manage.py command other than the development server."""
+    return os.path.basename(sys.argv[0]) in ('manage.py', 'django-admin') and sys.argv[1:2] != ['runserver']
+
+
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Connect the principal cache invalidation, catalogue version and image variant signals
+        from api import catalogue, images, principal  # noqa: F401
+
+        # Web processes with REWRITE_JOB_WORKERS set work off the queued rewrite jobs from the
+        # start, including those left over from before a restart (run_rewrite_jobs has its own)
+        if not running_management_command():
+            from api.jobs import start_job_workers
+            start_job_workers()
@@ -0,0 +1,199 @@
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from orm.models import CatalogueVersion, Product, User
+from .conditional import ListingValidators
+
+CachedResponse = namedtuple('CachedResponse', ['content', 'content_type', 'etag', 'last_modified'])
+
+_version_lock = threading.Lock()
+_version = None  # (version, time.monotonic() of the read)
+_bumps = 0  # Bumps made by this process, so a read that raced one is not kept
+
+
+def catalogue_version():
+    """
+    The current catalogue version, shared by every process through the CatalogueVersion
+    row. It is re-read at most every CATALOGUE_VERSION_RELOAD_INTERVAL seconds, so that
+    is how long a change made in another worker can take to show; changes made in this
+    process show at once.
+    """
+    global _version
+    with _version_lock:
+        current, bumps = _version, _bumps
+    if current is not None and time.monotonic() - current[1] < getattr(settings, 'CATALOGUE_VERSION_RELOAD_INTERVAL', 1):
+        return current[0]
+
+    read_at = time.monotonic()
+    version = CatalogueVersion.objects.filter(pk=1).values_list('version', flat=True).first()
+    if version is None:
+        version = CatalogueVersion.objects.get_or_create(pk=1)[0].version
+    with _version_lock:
+        if bumps == _bumps:
+            _version = (version, read_at)
+    return version
+
+
+def bump_catalogue_version():
+    """Move every process on to a new catalogue version, once the current transaction commits."""
+    transaction.on_commit(_bump)
+
+
+def _bump():
+    global _version, _bumps
+    if not CatalogueVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        CatalogueVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+    with _version_lock:
+        _version = None
+        _bumps += 1
+
+
+def normalize_coordinate(value):
+    """A latitude or longitude at the precision Product stores (6 decimals), for cache keys."""
+    return round(value, 6)
+
+
+class CatalogueCache:
+    """
+    Rendered responses of the public product listing, shared by every caller asking for
+    the same listing.
+
+    Entries are keyed on the normalized query parameters and the catalogue version.
+    Radius listings are keyed on the exact centre the view searches around (to the 6
+    decimals Product stores), since any coarser key would hand callers the products
+    around somebody else's position. Saving or deleting a Product or User bumps the version in the
+    database, so stale entries are never hit again by any worker and age out of the LRU.
+    Memory is bounded by CATALOGUE_CACHE_MAX_BYTES of response bodies, and entries also
+    expire after CATALOGUE_CACHE_TTL seconds.
+    """
+    params = ('query', 'category', 'lat', 'lng', 'radius', 'cursor', 'page_size', 'fields', 'expand')
+
+    def __init__(self, max_bytes, ttl):
+        self._lock = threading.Lock()
+        self._entries = TTLCache(maxsize=max_bytes, ttl=ttl, getsizeof=lambda entry: len(entry.content))
+        self.hits = self.misses = 0
+        self.hit_seconds = self.miss_seconds = 0.0
+
+    def key(self, request):
+        """The cache key of a listing request, or None when it can't be cached."""
+        renderer = getattr(request, 'accepted_renderer', None)
+        if getattr(renderer, 'format', None) != 'json':
+            return None
+
+        values = []
+        for name in self.params:
+            value = request.query_params.get(name)
+            if value is not None:
+                value = value.strip()
+                try:
+                    if name in ('lat', 'lng'):
+                        value = normalize_coordinate(float(value))
+                    elif name == 'radius':
+                        value = float(value)
+                except ValueError:
+                    pass  # Rejected by the view, and errors aren't cached
+                if name == 'query':
+                    value = value.lower()  # Matched with icontains
+            values.append(value)
+        return (catalogue_version(), request.get_host(), *values)
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key, entry):
+        with self._lock:
+            try:
+                self._entries[key] = entry
+            except ValueError:
+                pass  # Larger than the whole cache
+
+    def record(self, hit, seconds):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.hit_seconds += seconds
+            else:
+                self.misses += 1
+                self.miss_seconds += seconds
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / requests, 4) if requests else None,
+                'avg_hit_ms': round(self.hit_seconds / self.hits * 1000, 3) if self.hits else None,
+                'avg_miss_ms': round(self.miss_seconds / self.misses * 1000, 3) if self.misses else None,
+                'entries': len(self._entries),
+                'bytes': self._entries.currsize,
+                'max_bytes': self._entries.maxsize,
+                'version': catalogue_version(),
+            }
+
+
+catalogue_cache = CatalogueCache(
+    max_bytes=getattr(settings, 'CATALOGUE_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+    ttl=getattr(settings, 'CATALOGUE_CACHE_TTL', 300),
+)
+
+
+def cache_catalogue_listing(view_func):
+    """
+    Serve the public product listing from catalogue_cache, with an X-Cache: HIT/MISS
+    header. Product detail requests (a `product_id`) are passed through.
+    """
+    @wraps(view_func)
+    def wrapper(self, request, *args, **kwargs):
+        key = None if args or kwargs.get('product_id') else catalogue_cache.key(request)
+        if key is None:
+            return view_func(self, request, *args, **kwargs)
+
+        started = time.perf_counter()
+        entry = catalogue_cache.get(key)
+        if entry is not None:
+            validators = ListingValidators(entry.etag, entry.last_modified, private=False)
+            response = validators.not_modified(request) or validators.apply(
+                HttpResponse(entry.content, content_type=entry.content_type)
+            )
+            response['X-Cache'] = 'HIT'
+            catalogue_cache.record(True, time.perf_counter() - started)
+            return response
+
+        response = view_func(self, request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200:
+            # Render here instead of in finalize_response, to keep the bytes
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            response.render()
+            catalogue_cache.set(key, CachedResponse(
+                response.content, response['Content-Type'], response.get('ETag'),
+                parse_http_date_safe(response.get('Last-Modified', '')),
+            ))
+        response['X-Cache'] = 'MISS'
+        catalogue_cache.record(False, time.perf_counter() - started)
+        return response
+
+    return wrapper
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=User)  # Listings embed the product's creator
+@receiver(post_delete, sender=User)
+def _bump_on_change(sender, instance, **kwargs):
+    bump_catalogue_version()
@@ -0,0 +1,81 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+class ListingValidators:
+    """
+    ETag and Last-Modified of a listing, computed with one aggregate query instead of
+    serializing the rows.
+
+    The ETag hashes the row count and the latest `updated_at` of the filtered queryset
+    (plus any related timestamps passed in, e.g. the nested product of an order)
+    together with everything else the body depends on: the path and query string, the
+    host (absolute image URLs), the user and the renderer. Adding, editing or deleting a
+    listed row changes it. Nested users have no `updated_at`, so listings embedding them
+    pass the catalogue version (api.catalogue), which every User save bumps; those get
+    no Last-Modified, which a nested edit wouldn't move.
+
+        validators = ListingValidators.for_queryset(request, products, version=catalogue_version())
+        not_modified = validators.not_modified(request)
+        if not_modified:
+            return not_modified
+        ...
+        return validators.apply(echo(...))
+    """
+
+    def __init__(self, etag, last_modified, private=True):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.private = private
+
+    @classmethod
+    def for_queryset(cls, request, queryset, timestamp_fields=('updated_at',), private=True, version=None):
+        aggregates = {f'latest_{i}': Max(field) for i, field in enumerate(timestamp_fields)}
+        state = queryset.order_by().aggregate(count=Count('pk'), **aggregates)
+        timestamps = [state[f'latest_{i}'] for i in range(len(timestamp_fields))]
+        return cls.for_state(request, str(state['count']), timestamps, private, version)
+
+    @classmethod
+    def for_rows(cls, request, rows, private=True, version=None):
+        """The validators of rows already loaded (e.g. a radius search), by their ids in order."""
+        latest = max((row.updated_at for row in rows), default=None)
+        return cls.for_state(request, ','.join(str(row.pk) for row in rows), [latest], private, version)
+
+    @classmethod
+    def for_state(cls, request, rows_state, timestamps, private=True, version=None):
+        renderer = getattr(request, 'accepted_renderer', None)
+        key = '|'.join([
+            request.get_full_path(),
+            request.get_host(),
+            str(getattr(getattr(request, 'user', None), 'id', '') or ''),
+            getattr(renderer, 'format', '') or '',
+            '' if version is None else str(version),
+            rows_state,
+            *(timestamp.isoformat() if timestamp else '' for timestamp in timestamps),
+        ])
+        etag = f'W/"{hashlib.sha1(key.encode()).hexdigest()}"'
+        last_modified = None if version is not None else max(
+            (timestamp for timestamp in timestamps if timestamp), default=None
+        )
+        return cls(etag, int(last_modified.timestamp()) if last_modified else None, private)
+
+    def not_modified(self, request):
+        """A 304 response when the client's copy is current, else None."""
+        response = get_conditional_response(request, etag=self.etag, last_modified=self.last_modified)
+        return self.apply(response) if response is not None else None
+
+    def apply(self, response):
+        """Attach the validators to a 200 (or the 304) response."""
+        if response.status_code in (200, 304):
+            response['ETag'] = self.etag
+            if self.last_modified is not None:
+                response['Last-Modified'] = http_date(self.last_modified)
+            # Always revalidate; listings of a signed-in user stay out of shared caches
+            if self.private:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, no_cache=True)
+        return response
@@ -1,77 +1,159 @@
+import hashlib
 import logging
+import threading
+import time
 from functools import wraps
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
 from rest_framework_simplejwt.tokens import AccessToken
 from django.conf import settings
 # from orm.models import User, UserCompany
-from orm.models import User
-from _applibs.response import echo, Messages
+from .principal import get_principal
+from .revocation import revoked_tokens
+from _applibs.response import echo, echo_json, Messages
 from rest_framework import status
 from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from cachetools import LRUCache
 
 logger = logging.getLogger(__name__)
 
-def token_auth_required(view_func):
-    @wraps(view_func)
-    def _wrapped_view(self, request, *args, **kwargs):
-        # Try to get the access token from cookies
-        access_token = request.COOKIES.get('access')
-        # logger.info(f"cookie access token: {access_token}")
-        if not access_token:
-            # Try to get the access token from the Authorization header
-            auth_header = request.headers.get('Authorization')
-            # logger.info(f"auth header: {auth_header}")
-            if auth_header and auth_header.startswith('Bearer '):
-                access_token = auth_header[len('Bearer '):]
+_verified_tokens_lock = threading.Lock()
+_verified_tokens = LRUCache(maxsize=getattr(settings, 'VERIFIED_TOKEN_CACHE_SIZE', 10000))
+
+
+def verify_access_token(access_token):
+    """
+    AccessToken(access_token).payload, remembering tokens that already passed verification.
+
+    Entries are keyed by the token's SHA-256 digest and only trusted until the token's own
+    `exp`, so a repeat token skips signature verification but an expired one never passes.
+    """
+    digest = hashlib.sha256(access_token.encode()).digest()
+    with _verified_tokens_lock:
+        entry = _verified_tokens.get(digest)
+    if entry is not None:
+        payload, expires_at = entry
+        if time.time() < expires_at:
+            return payload
+        with _verified_tokens_lock:
+            _verified_tokens.pop(digest, None)
+
+    # Raises TokenError for an invalid or expired token
+    payload = dict(AccessToken(access_token).payload)
+    if 'exp' in payload:
+        with _verified_tokens_lock:
+            _verified_tokens[digest] = (payload, payload['exp'])
+    return payload
+
+
+def authenticate_request(request):
+    """
+    Resolve the user of a request from its access token (cookie or Bearer header).
+    Returns (user, None) on success or (None, error message) when authentication fails.
+    """
+    # Try to get the access token from cookies
+    access_token = request.COOKIES.get('access')
+    # logger.info(f"cookie access token: {access_token}")
+    if not access_token:
+        # Try to get the access token from the Authorization header
+        auth_header = request.headers.get('Authorization')
+        # logger.info(f"auth header: {auth_header}")
+        if auth_header and auth_header.startswith('Bearer '):
+            access_token = auth_header[len('Bearer '):]
+
+    # logger.info(f"access token: {access_token}")
+
+    if not access_token:
+        return None, "No access token found."
+
+    try:
+        # Attempt to validate the access token
+        payload = verify_access_token(access_token)
+
+    except TokenError:
+        # Expired or invalid access token: fall back to the refresh token
+        refresh_token = request.COOKIES.get('refresh')
+        if not refresh_token:
+            return None, "Invalid access token and no refresh token provided."
+
+        try:
+            # Validate the refresh token (signature and expiry only, no database lookup)
+            refresh = RefreshToken(refresh_token)
+        except TokenError as e:
+            return None, f"Refresh token is invalid: {str(e)}"
 
-        # logger.info(f"access token: {access_token}")
+        # Check revocation against the in-memory set of revoked token ids
+        if revoked_tokens.is_revoked(refresh[api_settings.JTI_CLAIM]):
+            return None, "Refresh token is blacklisted."
 
-        if not access_token:
-            return echo(status=status.HTTP_401_UNAUTHORIZED, msg="No access token found.")
+        # Issue a new access token; the decorator returns it on the real response
+        new_access_token = refresh.access_token
+        request.refreshed_access_token = str(new_access_token)
+        payload = new_access_token.payload
 
-        try:
-            # Attempt to validate the access token
-            payload = AccessToken(access_token).payload
+    # Validate the user
+    user = get_principal(payload['user_id'])
+    if not user:
+        return None, 'User not found!'
 
-           
-        except InvalidToken:
-            # Check for a refresh token if access token is invalid
-            refresh_token = request.COOKIES.get('refresh')
-            if not refresh_token:
-                return echo(status=status.HTTP_401_UNAUTHORIZED, msg="Invalid access token and no refresh token provided.")
+    return user, None
 
-            try:
-                # Check if the refresh token is blacklisted
-                if RefreshToken.is_blacklisted(refresh_token):
-                    return echo(status=status.HTTP_401_UNAUTHORIZED, msg="Refresh token is blacklisted.")
-                
-                # Validate the refresh token and issue a new access token
-                refresh = RefreshToken(refresh_token)
-                new_access_token = refresh.access_token
 
-                # Optionally: Save the new access token to the user's cookies
-                response = JsonResponse({"message": "Token refreshed"})
-                response.set_cookie('access', str(new_access_token), httponly=True, secure=True, samesite='None')
+def authenticate_access_token(access_token):
+    """
+    Resolve the user of a bare access token, for transports without cookies or refresh
+    (e.g. the chat WebSocket). Returns (user, None) or (None, error message).
+    """
+    try:
+        payload = verify_access_token(access_token)
+    except (TokenError, InvalidToken) as e:
+        return None, f"Token error: {str(e)}"
 
-                # Set the new access token in the request
-                payload = new_access_token.payload
+    user = get_principal(payload['user_id'])
+    if not user:
+        return None, 'User not found!'
 
-            except (TokenError, InvalidToken) as e:
-                return echo(status=status.HTTP_401_UNAUTHORIZED, msg=f"Refresh token is invalid: {str(e)}")
+    return user, None
 
-        except TokenError as e:
-            return echo(status=status.HTTP_401_UNAUTHORIZED, msg=f"Token error: {str(e)}")
 
-        # Validate the user
-        user = User.objects.filter(id=payload['user_id']).first()
-        if not user:
-            return echo(status=status.HTTP_401_UNAUTHORIZED, msg='User not found!')
+def attach_refreshed_token(request, response):
+    """Hand an access token minted by authenticate_request back to the client."""
+    new_access_token = getattr(request, 'refreshed_access_token', None)
+    if new_access_token:
+        response.set_cookie('access', new_access_token, httponly=True, secure=True, samesite='None')
+        # For clients that send the token in the Authorization header
+        response['X-Access-Token'] = new_access_token
+    return response
+
+
+def token_auth_required(view_func):
+    @wraps(view_func)
+    def _wrapped_view(self, request, *args, **kwargs):
+        user, error = authenticate_request(request)
+        if error:
+            return echo(status=status.HTTP_401_UNAUTHORIZED, msg=error)
 
         request.user = user
 
         # Call the original view
-        return view_func(self, request, *args, **kwargs)
+        return attach_refreshed_token(request, view_func(self, request, *args, **kwargs))
+
+    return _wrapped_view
+
+
+def async_token_auth_required(view_func):
+    """token_auth_required for the async handlers of plain Django views served over ASGI."""
+    @wraps(view_func)
+    async def _wrapped_view(self, request, *args, **kwargs):
+        user, error = await sync_to_async(authenticate_request)(request)
+        if error:
+            return echo_json(status=status.HTTP_401_UNAUTHORIZED, msg=error)
+
+        request.user = user
+
+        # Call the original view
+        return attach_refreshed_token(request, await view_func(self, request, *args, **kwargs))
 
     return _wrapped_view
 
@@ -92,10 +174,10 @@ def token_auth_not_required(view_func):
         if access_token:
             try:
                 # Validate the access token
-                payload = AccessToken(access_token).payload
+                payload = verify_access_token(access_token)
 
                 # Retrieve the user
-                user = User.objects.filter(id=payload.get('user_id')).first()
+                user = get_principal(payload.get('user_id'))
                 if user:
                     request.user = user
                 else:
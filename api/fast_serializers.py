@@ -0,0 +1,442 @@
+import decimal
+import threading
+from collections import namedtuple
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from drf_extra_fields.fields import Base64FieldMixin
+from rest_framework import fields, serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+
+
+CHAR, INTEGER, BOOLEAN, CHOICE, DATETIME, DECIMAL, FILE, METHOD, NESTED, NESTED_MANY, FALLBACK = range(11)
+
+# `column` is the model field the step reads (None when unknown, e.g. method fields),
+# `attname` the foreign key column a nested relation collapses to when it is not expanded
+# and `relation` the path to select_related/prefetch_related for a nested relation
+Step = namedtuple('Step', ['name', 'getter', 'kind', 'arg', 'column', 'attname', 'relation'], defaults=[None])
+
+
+def _uses(field, base, *names):
+    """True when the field class inherits `base`'s implementation of every method in `names`."""
+    return isinstance(field, base) and all(getattr(type(field), name) is getattr(base, name) for name in names)
+
+
+class ReadPlan:
+    """
+    Read-only representation of a DRF serializer, compiled once per serializer class.
+
+    The serializer's readable fields are turned into a flat list of steps. Serializing a
+    row is then a single loop building a dict, instead of DRF's per-field
+    get_attribute/to_representation calls through every nested serializer.
+    Common field types are converted inline with exactly DRF's rules; anything else
+    (custom fields, dotted sources, non-ISO datetime formats, ...) goes through the DRF
+    field itself, so the output always matches `serializer_class(instance).data`.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        template = serializer_class()
+        self.model = getattr(getattr(serializer_class, 'Meta', None), 'model', None)
+        self.steps = [self._compile(field) for field in template._readable_fields]
+
+    def _compile(self, field):
+        name = field.field_name
+        model_field = None
+
+        if isinstance(field, serializers.ListSerializer):
+            if len(field.source_attrs) == 1 and self.model is not None and self._is_many_relation(field.source):
+                plan = get_plan(type(field.child))
+                return Step(name, attrgetter(field.source), NESTED_MANY, plan, None, None, field.source)
+            return Step(name, None, FALLBACK, None, None, None)
+
+        if field.source == '*':
+            getter = None
+        elif len(field.source_attrs) == 1 and self.model is not None:
+            model_field = self._get_model_field(field.source)
+            if model_field is None:
+                return Step(name, None, FALLBACK, None, None, None)
+            getter = attrgetter(field.source)
+        else:
+            return Step(name, None, FALLBACK, None, None, None)
+
+        column = model_field.name if model_field is not None else None
+        if isinstance(field, serializers.BaseSerializer):
+            if model_field is None or not model_field.is_relation:
+                return Step(name, getter, NESTED, get_plan(type(field)), column, None)
+            attname = model_field.attname if model_field.many_to_one else None
+            return Step(name, getter, NESTED, get_plan(type(field)), column, attname, column)
+        if isinstance(field, fields.SerializerMethodField):
+            return Step(name, getter, METHOD, field.method_name, None, None)
+        if getter is None:
+            return Step(name, None, FALLBACK, None, None, None)
+
+        kind, arg = FALLBACK, None
+        if _uses(field, fields.CharField, 'to_representation'):
+            kind = CHAR
+        elif _uses(field, fields.IntegerField, 'to_representation'):
+            kind = INTEGER
+        elif _uses(field, fields.BooleanField, 'to_representation'):
+            kind, arg = BOOLEAN, field
+        elif _uses(field, fields.ChoiceField, 'to_representation'):
+            kind, arg = CHOICE, field.choice_strings_to_values
+        elif _uses(field, fields.DateTimeField, 'to_representation', 'enforce_timezone'):
+            output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+            if output_format is not None and output_format.lower() == 'iso-8601':
+                kind, arg = DATETIME, field
+        elif _uses(field, fields.DecimalField, 'to_representation', 'quantize'):
+            if (getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+                    and not field.localize and not field.normalize_output and field.decimal_places is not None):
+                kind, arg = DECIMAL, field
+        elif _uses(field, fields.FileField, 'to_representation') or (
+                isinstance(field, Base64FieldMixin) and not field.represent_in_base64
+                and type(field).to_representation is Base64FieldMixin.to_representation):
+            kind, arg = FILE, getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+
+        if kind == FALLBACK:
+            # Still a plain model column, so it can be projected
+            return Step(name, None, FALLBACK, None, column, None)
+        return Step(name, getter, kind, arg, column, None)
+
+    def _get_model_field(self, name):
+        try:
+            field = self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.many_to_many:
+            return None
+        return field
+
+    def _is_many_relation(self, name):
+        try:
+            field = self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        return field.is_relation and (field.many_to_many or field.one_to_many)
+
+    def select(self, fieldset):
+        """The steps kept by `fieldset`, each with its nested fieldset (None for the whole relation)."""
+        for step in self.steps:
+            if fieldset is None:
+                yield step, None
+            elif fieldset.fields is None or step.name in fieldset.fields:
+                yield step, fieldset.nested(step.name)
+
+    def bind(self, context, fieldset=None):
+        """Resolve the request- and timezone-dependent parts; returns instance -> dict."""
+        serializer = None
+        bound_fields = None
+        steps = []
+
+        for step, nested in self.select(fieldset):
+            name, getter, kind, arg = step.name, step.getter, step.kind, step.arg
+
+            if kind == FALLBACK:
+                if bound_fields is None:
+                    serializer = serializer or self.serializer_class(context=context)
+                    bound_fields = serializer.fields
+                field = bound_fields[name]
+                steps.append((name, field.get_attribute, _fallback(field)))
+                continue
+
+            if kind in (NESTED, NESTED_MANY) and nested is not None and nested.collapsed:
+                # Not expanded: just the related id(s), without loading the related row
+                if kind == NESTED_MANY:
+                    steps.append((name, getter, _many(attrgetter('pk'))))
+                    continue
+                if step.attname is not None:
+                    steps.append((name, attrgetter(step.attname), _identity))
+                    continue
+
+            if kind == METHOD:
+                serializer = serializer or self.serializer_class(context=context)
+                convert = getattr(serializer, arg)
+            elif kind == NESTED:
+                convert = _memoized(arg.bind(context, nested))
+            elif kind == NESTED_MANY:
+                convert = _many(arg.bind(context, nested))
+            else:
+                convert = _CONVERTERS[kind](arg, context)
+            steps.append((name, getter or _identity, convert))
+
+        def to_representation(instance):
+            ret = {}
+            for name, getter, convert in steps:
+                try:
+                    value = getter(instance)
+                except SkipField:
+                    continue
+                ret[name] = None if value is None else convert(value)
+            return ret
+
+        return to_representation
+
+    def columns(self, fieldset, prefix=''):
+        """
+        The model fields read by the selected steps, including those of expanded nested
+        objects as `relation__field`, or None when some selected field reads something
+        that can't be known in advance (method fields, dotted sources).
+        """
+        columns = []
+        for step, nested in self.select(fieldset):
+            if step.kind == NESTED_MANY:
+                continue  # Prefetched by a separate query
+            if step.column is None:
+                return None
+            columns.append(prefix + step.column)
+            if step.relation is not None and not (nested is not None and nested.collapsed):
+                # Unknown nested columns just load the whole related row
+                columns.extend(step.arg.columns(nested, f"{prefix}{step.relation}__") or [])
+        return columns
+
+    def related(self, fieldset, prefix=''):
+        """The (select_related, prefetch_related) paths of the nested objects the selected steps read."""
+        select_related, prefetch_related = [], []
+        for step, nested in self.select(fieldset):
+            if step.relation is None:
+                continue
+            path = prefix + step.relation
+            if step.kind == NESTED_MANY:
+                prefetch_related.append(path)
+                if not (nested is not None and nested.collapsed):
+                    prefetch_related.extend(sum(step.arg.related(nested, f"{path}__"), []))
+            elif not (nested is not None and nested.collapsed):
+                nested_select, nested_prefetch = step.arg.related(nested, f"{path}__")
+                select_related += [path, *nested_select]
+                prefetch_related += nested_prefetch
+        return select_related, prefetch_related
+
+
+class Fieldset:
+    """
+    Sparse fieldset and expansion control parsed from the `fields` and `expand` query
+    parameters, e.g. `?fields=id,title,created_by.name&expand=created_by`.
+
+    `fields` lists the keys to return; dotted names select inside a nested object and
+    imply its expansion. When `expand` is given, nested objects not listed in it collapse
+    to their id; without it every nested object is returned in full, as before.
+    """
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def __init__(self, fields=None, expand=None, collapsed=False):
+        self.fields = fields  # name -> dotted sub-paths, or None for all fields
+        self.expand = expand  # name -> dotted sub-paths, or None to expand everything
+        self.collapsed = collapsed
+
+    @classmethod
+    def from_request(cls, request):
+        """The requested fieldset, or None when the client asked for the full representation."""
+        params = request.query_params
+        if cls.fields_query_param not in params and cls.expand_query_param not in params:
+            return None
+        fields = cls._parse(params.get(cls.fields_query_param)) if cls.fields_query_param in params else None
+        expand = cls._parse(params.get(cls.expand_query_param)) if cls.expand_query_param in params else None
+        return cls(fields, expand)
+
+    @staticmethod
+    def _parse(value):
+        tree = {}
+        for path in (value or '').split(','):
+            name, _, rest = path.strip().partition('.')
+            if name:
+                tree.setdefault(name, [])
+                if rest:
+                    tree[name].append(rest)
+        return tree
+
+    def nested(self, name):
+        """The fieldset applying inside the nested object `name`."""
+        sub_fields = None
+        if self.fields is not None and self.fields.get(name):
+            sub_fields = self._parse(','.join(self.fields[name]))
+
+        if self.expand is None:
+            return Fieldset(sub_fields, None) if sub_fields is not None else None
+        if name in self.expand:
+            return Fieldset(sub_fields, self._parse(','.join(self.expand[name])))
+        # A dotted `fields` entry expands the relation even when `expand` leaves it out
+        return Fieldset(sub_fields, {}, collapsed=sub_fields is None)
+
+    def project(self, queryset, serializer_class):
+        """
+        Restrict the queryset to the columns the selected fields read, plus its ordering
+        columns. Left unchanged when all fields are selected or the columns can't be known.
+        """
+        if self.fields is None:
+            return queryset
+        columns = get_plan(serializer_class).columns(self)
+        if columns is None:
+            return queryset
+        # Keep the model columns the queryset is ordered by (not annotations such as a search rank)
+        ordering = [name.lstrip('-') for name in queryset.query.order_by if isinstance(name, str)]
+        ordering = [name for name in ordering if name == 'pk' or self._is_field(queryset.model, name)]
+        return queryset.only(*columns, *ordering)
+
+    @staticmethod
+    def _is_field(model, name):
+        try:
+            model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        return True
+
+
+def _identity(value):
+    return value
+
+
+def _fallback(field):
+    def convert(value):
+        if isinstance(value, PKOnlyObject) and value.pk is None:
+            return None
+        return field.to_representation(value)
+    return convert
+
+
+def _memoized(to_representation):
+    """Serialize each related object once per call; e.g. the same seller on every row."""
+    cache = {}
+
+    def convert(value):
+        pk = getattr(value, 'pk', None)
+        if pk is None:
+            return to_representation(value)
+        key = (type(value), pk)
+        if key not in cache:
+            cache[key] = to_representation(value)
+        return cache[key]
+    return convert
+
+
+def _many(to_representation):
+    def convert(value):
+        iterable = value.all() if hasattr(value, 'all') else value
+        return [to_representation(item) for item in iterable]
+    return convert
+
+
+def _char(arg, context):
+    return str
+
+
+def _integer(arg, context):
+    return int
+
+
+def _boolean(field, context):
+    def convert(value):
+        if value is True or value is False:
+            return value
+        return field.to_representation(value)
+    return convert
+
+
+def _choice(choice_strings_to_values, context):
+    get = choice_strings_to_values.get
+
+    def convert(value):
+        if value == '':
+            return value
+        return get(str(value), value)
+    return convert
+
+
+def _datetime(field, context):
+    tz = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+
+    def convert(value):
+        if isinstance(value, str):
+            return value
+        if tz is None or value.utcoffset() is None:
+            return field.to_representation(value)
+        value = value.astimezone(tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def _decimal(field, context):
+    decimal_context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        decimal_context.prec = field.max_digits
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=decimal_context))
+    return convert
+
+
+def _file(use_url, context):
+    request = context.get('request', None)
+    build_absolute_uri = request.build_absolute_uri if request is not None else None
+
+    def convert(value):
+        if not value:
+            return None
+        if not use_url:
+            return value.name
+        try:
+            url = value.url
+        except AttributeError:
+            return None
+        return build_absolute_uri(url) if build_absolute_uri else url
+    return convert
+
+
+_CONVERTERS = {
+    CHAR: _char, INTEGER: _integer, BOOLEAN: _boolean, CHOICE: _choice,
+    DATETIME: _datetime, DECIMAL: _decimal, FILE: _file,
+}
+
+_plans = {}
+_plans_lock = threading.RLock()  # Compiling a plan compiles its nested plans
+
+
+def get_plan(serializer_class):
+    """The compiled ReadPlan of a serializer class."""
+    plan = _plans.get(serializer_class)
+    if plan is None:
+        with _plans_lock:
+            plan = _plans.get(serializer_class)
+            if plan is None:
+                plan = _plans[serializer_class] = ReadPlan(serializer_class)
+    return plan
+
+
+def setup_eager_loading(queryset, serializer_class, fieldset=None):
+    """
+    Plan the queryset for serializer_class: select_related the nested objects it
+    renders (prefetch_related for nested lists), skipping the relations a fieldset
+    collapses to ids, then narrow the columns to the fieldset.
+
+    The paths come from the compiled ReadPlan, so every serializer gets them without
+    declaring anything and they follow changes to its nested fields.
+    """
+    select_related, prefetch_related = get_plan(serializer_class).related(fieldset)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    if fieldset is not None:
+        queryset = fieldset.project(queryset, serializer_class)
+    return queryset
+
+
+def fast_serialize(serializer_class, instance, many=False, context=None, fieldset=None):
+    """
+    Read-only equivalent of `serializer_class(instance, many=many, context=context).data`
+    for list endpoints, optionally restricted to a Fieldset. Nested objects shared by
+    several rows are serialized once and the same dict is reused, so treat the result
+    as read-only.
+    """
+    to_representation = get_plan(serializer_class).bind(context or {}, fieldset)
+    if many:
+        return [to_representation(item) for item in instance]
+    return to_representation(instance)
@@ -1,4 +1,8 @@
+import base64
+import json
 from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 from datetime import  timedelta
 from orm.models import User
@@ -45,5 +49,72 @@ class CustomPagination(PageNumberPagination):
     max_page_size = 100  # Maximum number of items per page
 
 
+class KeysetPagination:
+    """
+    Cursor pagination on (created_at, id), newest first.
+
+    The cursor is an opaque token holding the (created_at, id) of the last row of the
+    previous page, so each page is a single indexed range scan no matter how deep the
+    client pages, and rows inserted meanwhile never shift or repeat results.
+    Paging is opt-in: it applies when the client sends `cursor` or `page_size`.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+
+    def __init__(self):
+        self.max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+        self.next_cursor = None
+        self.page_size_used = self.page_size
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid page size.")
+        if page_size < 1:
+            raise ValueError("Invalid page size.")
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, obj):
+        raw = json.dumps({'c': obj.created_at.isoformat(), 'i': obj.id}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            created_at, pk = parse_datetime(data['c']), int(data['i'])
+        except (TypeError, ValueError, KeyError):
+            raise ValueError("Invalid cursor.")
+        if created_at is None:
+            raise ValueError("Invalid cursor.")
+        return created_at, pk
+
+    def paginate_queryset(self, queryset, request):
+        """Return one page of `queryset`; raises ValueError for a bad cursor or page size."""
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-created_at', '-id')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
 
+        # Fetch one extra row to know whether there is a next page
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if len(rows) > page_size else None
+        self.page_size_used = page_size
+        return page
 
+    def get_paginated_data(self, data):
+        return {
+            'results': data,
+            'next_cursor': self.next_cursor,
+            'page_size': self.page_size_used,
+        }
@@ -0,0 +1,72 @@
+from math import radians, degrees, cos, sin, sqrt, atan2, asin
+import numpy as np
+
+EARTH_RADIUS_KM = 6371  # Radius of Earth in kilometers
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometers."""
+    d_lat = radians(lat2 - lat1)
+    d_lon = radians(lon2 - lon1)
+    a = sin(d_lat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(d_lon / 2) ** 2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_many(lat, lng, lats, lngs):
+    """Vectorized Haversine: distances in kilometers from (lat, lng) to every point of the arrays."""
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def bounding_box(lat, lng, radius):
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) enclosing the circle of `radius` km
+    around (lat, lng). The longitude bounds are None when the box touches a pole or
+    wraps around the antimeridian, in which case only the latitude band can be used.
+    """
+    d_lat = degrees(radius / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - d_lat, lat + d_lat
+
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90), min(max_lat, 90), None, None
+
+    d_lng = degrees(asin(min(1, sin(radius / EARTH_RADIUS_KM) / cos(radians(lat)))))
+    min_lng, max_lng = lng - d_lng, lng + d_lng
+
+    if min_lng < -180 or max_lng > 180:
+        return min_lat, max_lat, None, None
+
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def filter_by_radius(queryset, lat, lng, radius):
+    """
+    Return the products of `queryset` within `radius` km of (lat, lng), closest first.
+
+    The (lat, lng) index narrows the scan to the bounding box of the circle. Only the
+    (id, lat, lng) columns of the candidates are loaded and checked in one vectorized
+    pass, then the matching products are fetched by id.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius)
+
+    candidates = queryset.filter(lat__isnull=False, lng__isnull=False, lat__range=(min_lat, max_lat))
+    if min_lng is not None:
+        candidates = candidates.filter(lng__range=(min_lng, max_lng))
+
+    rows = list(candidates.values_list('id', 'lat', 'lng'))
+    if not rows:
+        return []
+
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    lats = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    lngs = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+
+    distances = haversine_many(lat, lng, lats, lngs)
+    matches = np.flatnonzero(distances <= radius)
+    matches = matches[np.argsort(distances[matches], kind='stable')]
+
+    products = queryset.in_bulk(ids[matches].tolist())
+    return [products[product_id] for product_id in ids[matches].tolist()]
@@ -0,0 +1,222 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.timezone import now
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+from orm.models import Product, User
+from .catalogue import bump_catalogue_version
+
+logger = logging.getLogger(__name__)
+
+# The image field each model keeps its upload in; variants go to `image_variants`
+IMAGE_FIELDS = {Product: 'image', User: 'profile_picture'}
+
+FORMATS = {
+    # variant format -> (Pillow format, extension, save options)
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def variant_sizes():
+    """Variant name -> longest side in pixels, from the IMAGE_VARIANT_SIZES setting."""
+    return getattr(settings, 'IMAGE_VARIANT_SIZES', {'thumb': 320, 'medium': 960})
+
+
+def render_variants(image, storage, name):
+    """
+    Write the resized WebP and JPEG variants of the image stored as `name`.
+
+    Returns the `image_variants` value: the source name plus, per size, the stored
+    name of each format and the pixel size. Images are never upscaled, so small
+    uploads get variants of their own size. Names carry a hash of the variant's bytes,
+    so regenerating variants (e.g. with other IMAGE_VARIANT_SIZES) never reuses a name
+    that clients cache as immutable (see api.media).
+    """
+    stem = os.path.splitext(name)[0]
+    variants = {'source': name}
+    for size_name, size in variant_sizes().items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+        variant = {'width': resized.width, 'height': resized.height}
+        for format_name, (pil_format, extension, options) in FORMATS.items():
+            if pil_format == 'JPEG' and resized.mode != 'RGB':
+                output = resized.convert('RGB')
+            else:
+                output = resized
+            buffer = BytesIO()
+            output.save(buffer, pil_format, **options)
+            content = buffer.getvalue()
+            digest = hashlib.sha256(content).hexdigest()[:16]
+            variant_name = f"{stem}_{size_name}.{digest}.{extension}"
+            # Same name, same bytes: keep the existing file
+            if not storage.exists(variant_name):
+                variant_name = storage.save(variant_name, ContentFile(content))
+            variant[format_name] = variant_name
+        variants[size_name] = variant
+    return variants
+
+
+def variant_names(variants):
+    """The stored file names listed in an `image_variants` value."""
+    for variant in (variants or {}).values():
+        if isinstance(variant, dict):
+            for format_name in FORMATS:
+                if variant.get(format_name):
+                    yield variant[format_name]
+
+
+def delete_variants(storage, variants, keep=()):
+    for name in variant_names(variants):
+        if name not in keep:
+            try:
+                storage.delete(name)
+            except Exception as e:
+                logger.warning(f"Failed to delete image variant {name}: {e}")
+
+
+class ImagePipeline:
+    """
+    Generates the thumbnails and WebP variants of uploaded images in a pool of
+    IMAGE_PIPELINE_WORKERS threads, so the request that saved the upload only writes
+    the original file.
+
+    Jobs start once the saving transaction commits and are deduplicated per model row.
+    A finished job stores the variants only if the row still holds the same upload
+    (a newer upload has its own job), touching `updated_at` and the catalogue version
+    so cached listings and ETags pick the thumbnails up.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = set()  # (model, pk, name)
+
+    def schedule(self, instance):
+        """Queue the variants of `instance`'s current image after the transaction commits."""
+        model = type(instance)
+        name = getattr(instance, IMAGE_FIELDS[model]).name
+        if not name:
+            return
+        job = (model, instance.pk, name)
+        transaction.on_commit(lambda: self.submit(*job))
+
+    def submit(self, model, pk, name):
+        job = (model, pk, name)
+        with self._lock:
+            if job in self._pending:
+                return None
+            self._pending.add(job)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='images')
+            executor = self._executor
+        return executor.submit(self._run, model, pk, name)
+
+    def _run(self, model, pk, name):
+        close_old_connections()
+        try:
+            self.process(model, pk, name)
+        except UnidentifiedImageError:
+            # Uploads are only type-checked on their first bytes
+            logger.warning(f"Image variants skipped for {model.__name__} {pk}: {name} is not a readable image")
+        except Exception as e:
+            logger.exception(f"Image variants failed for {model.__name__} {pk} ({name}): {e}")
+        finally:
+            with self._lock:
+                self._pending.discard((model, pk, name))
+            close_old_connections()
+
+    def process(self, model, pk, name):
+        """Render and store the variants of one upload, synchronously. Returns them, or None."""
+        field_name = IMAGE_FIELDS[model]
+        storage = model._meta.get_field(field_name).storage
+        row = model.objects.filter(pk=pk, **{field_name: name}).values('image_variants').first()
+        if row is None:
+            return None  # Deleted, or replaced by a newer upload
+        previous = row['image_variants'] or {}
+
+        with storage.open(name, 'rb') as source:
+            with Image.open(source) as image:
+                image = ImageOps.exif_transpose(image)
+                image.load()
+        variants = render_variants(image, storage, name)
+
+        updates = {'image_variants': variants}
+        if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+            updates['updated_at'] = now()
+        # Don't overwrite the variants of an upload that replaced this one meanwhile
+        if not model.objects.filter(pk=pk, **{field_name: name}).update(**updates):
+            delete_variants(storage, variants)
+            return None
+        delete_variants(storage, previous, keep=set(variant_names(variants)))
+        bump_catalogue_version()
+        return variants
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+image_pipeline = ImagePipeline(max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2))
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Read-only URLs of the variants written by the image pipeline:
+    `{"thumb": {"webp": url, "jpeg": url, "width": 320, "height": 240}, ...}`,
+    or null while they are pending (clients fall back to the original).
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not isinstance(value, dict):
+            return {}
+        model = self.parent.Meta.model
+        storage = model._meta.get_field(IMAGE_FIELDS[model]).storage
+        request = self.context.get('request')
+        ret = {}
+        for size_name, variant in value.items():
+            if not isinstance(variant, dict):
+                continue
+            urls = {}
+            for key, item in variant.items():
+                if key in FORMATS:
+                    url = storage.url(item)
+                    urls[key] = request.build_absolute_uri(url) if request is not None else url
+                else:
+                    urls[key] = item
+            ret[size_name] = urls
+        return ret
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=User)
+def _schedule_variants(sender, instance, **kwargs):
+    image = getattr(instance, IMAGE_FIELDS[sender])
+    if image and (instance.image_variants or {}).get('source') != image.name:
+        image_pipeline.schedule(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=User)
+def _delete_variants(sender, instance, **kwargs):
+    if instance.image_variants:
+        storage = sender._meta.get_field(IMAGE_FIELDS[sender]).storage
+        transaction.on_commit(lambda: delete_variants(storage, instance.image_variants))
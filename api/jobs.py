@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from cachetools import TTLCache
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+
+from orm.models import Product, RewriteJob
+from .rewrite import rewriter
+
+logger = logging.getLogger(__name__)
+
+Job = namedtuple('Job', [
+    'id', 'user_id', 'product_id', 'title', 'category', 'status', 'result', 'error',
+    'created_at', 'started_at', 'finished_at',
+])
+
+
+def new_job(user_id, title, category, product_id=None):
+    """A queued Job; raises ValueError when the title or category doesn't fit its RewriteJob column."""
+    for field, value in (('title', title), ('category', category)):
+        max_length = RewriteJob._meta.get_field(field).max_length
+        if len(value) > max_length:
+            raise ValueError(f"The {field} must be at most {max_length} characters long.")
+    return Job(uuid.uuid4(), user_id, product_id, title, category, 'queued', None, None, now(), None, None)
+
+
+class BaseJobBackend:
+    """
+    Storage of the submit-then-fetch AI rewrite jobs.
+
+    Jobs are Job tuples. `enqueue` and `get` are called by views, `claim` and `finish`
+    by the worker threads; all of them may be called from any thread. A backend
+    shared between processes lets one `run_rewrite_jobs` process work off the jobs
+    submitted to every web worker.
+
+    `poll_interval` is how often (seconds) callers waiting on a job re-read it.
+    """
+    poll_interval = 1.0
+
+    def enqueue(self, job):
+        raise NotImplementedError
+
+    def claim(self, timeout):
+        """Mark the oldest queued job running and return it, or None after `timeout` seconds."""
+        raise NotImplementedError
+
+    def finish(self, job, result=None, error=None):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def purge(self):
+        """Housekeeping, run by the workers when they start and every minute or so."""
+
+
+class InMemoryJobBackend(BaseJobBackend):
+    """Jobs of the current process only; enough for a single worker."""
+    poll_interval = 0.05
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._jobs = TTLCache(maxsize=100000, ttl=getattr(settings, 'REWRITE_JOB_TTL', 24 * 60 * 60))
+
+    def enqueue(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+        self._queue.put(job.id)
+        return job
+
+    def claim(self, timeout):
+        try:
+            job_id = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != 'queued':
+                return None
+            job = self._jobs[job_id] = job._replace(status='running', started_at=now())
+        return job
+
+    def finish(self, job, result=None, error=None):
+        job = job._replace(status='failed' if error else 'done', result=result, error=error, finished_at=now())
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+class DatabaseJobBackend(BaseJobBackend):
+    """
+    Jobs in the RewriteJob table, shared by every process.
+
+    Workers claim a job with a conditional UPDATE, so two processes never run the same
+    one. Jobs queued in this process wake its workers at once; jobs from other
+    processes are picked up within REWRITE_JOB_POLL_INTERVAL seconds. Jobs left
+    running for longer than REWRITE_JOB_STALE_AFTER seconds (a worker died) are queued
+    again, and finished jobs are deleted after REWRITE_JOB_TTL seconds.
+    """
+    fields = Job._fields
+
+    # Waiting callers re-read a job by its primary key, which is cheap
+    poll_interval = 0.25
+
+    def __init__(self):
+        self._wakeup = threading.Condition()
+        self._pending = 0
+
+    def enqueue(self, job):
+        RewriteJob.objects.create(**{field: getattr(job, field) for field in self.fields})
+        with self._wakeup:
+            self._pending += 1
+            self._wakeup.notify()
+        return job
+
+    def claim(self, timeout):
+        deadline = time.monotonic() + timeout
+        poll_interval = getattr(settings, 'REWRITE_JOB_POLL_INTERVAL', 1.0)
+        while True:
+            job = self._claim_next()
+            if job is not None:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            with self._wakeup:
+                if not self._pending:
+                    self._wakeup.wait(min(poll_interval, remaining))
+                self._pending = max(self._pending - 1, 0)
+
+    def _claim_next(self):
+        for job_id in RewriteJob.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True)[:5]:
+            started_at = now()
+            if RewriteJob.objects.filter(id=job_id, status='queued').update(status='running', started_at=started_at):
+                return self.get(job_id)
+        return None
+
+    def finish(self, job, result=None, error=None):
+        job = job._replace(status='failed' if error else 'done', result=result, error=error, finished_at=now())
+        RewriteJob.objects.filter(id=job.id).update(
+            status=job.status, result=result, error=error, finished_at=job.finished_at,
+        )
+        return job
+
+    def get(self, job_id):
+        row = RewriteJob.objects.filter(id=job_id).values_list(*self.fields).first()
+        return Job(*row) if row else None
+
+    def purge(self):
+        ttl = getattr(settings, 'REWRITE_JOB_TTL', 24 * 60 * 60)
+        stale_after = getattr(settings, 'REWRITE_JOB_STALE_AFTER', 300)
+        RewriteJob.objects.filter(finished_at__lt=now() - timedelta(seconds=ttl)).delete()
+        RewriteJob.objects.filter(status='running', started_at__lt=now() - timedelta(seconds=stale_after)).update(
+            status='queued', started_at=None,
+        )
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_job_backend():
+    """The process-wide job backend selected by settings.REWRITE_JOB_BACKEND."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(getattr(settings, 'REWRITE_JOB_BACKEND', 'api.jobs.DatabaseJobBackend'))()
+    return _backend
+
+
+def run_job(job):
+    """Rewrite the job's description and write it onto its product, if it has one. Returns the text."""
+    result, _ = rewriter.rewrite(job.title, job.category)
+    if job.product_id is not None:
+        product = Product.objects.filter(id=job.product_id, created_by_id=job.user_id).first()
+        if product is not None:
+            product.description = result
+            product.save(update_fields=['description', 'updated_at'])
+    return result
+
+
+class JobWorkers:
+    """
+    A pool of threads working off the queued rewrite jobs. Every rewrite that misses
+    the cache is run as a job, so the pool size caps the concurrent upstream calls of
+    the process: run the workers in one `run_rewrite_jobs` process (and none in the
+    web processes) for a cap across every caller.
+    """
+
+    def __init__(self, count, backend=None):
+        self.count = count
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Start the threads, once."""
+        with self._lock:
+            if self._threads or self.count <= 0:
+                return
+            self._stopping.clear()
+            for i in range(self.count):
+                thread = threading.Thread(target=self._work, name=f'rewrite-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, wait=True):
+        self._stopping.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _work(self):
+        backend = self.backend or get_job_backend()
+        # Purge at once, so jobs left running by a worker that died are queued again
+        last_purge = None
+        while not self._stopping.is_set():
+            try:
+                if last_purge is None or time.monotonic() - last_purge > 60:
+                    last_purge = time.monotonic()
+                    backend.purge()
+                job = backend.claim(timeout=1.0)
+                if job is not None:
+                    self.process(backend, job)
+            except Exception as e:
+                logger.exception(f"Rewrite job worker error: {e}")
+                time.sleep(1.0)
+            finally:
+                close_old_connections()
+
+    def process(self, backend, job):
+        try:
+            result = run_job(job)
+        except Exception as e:
+            logger.warning(f"Rewrite job {job.id} failed: {e}")
+            return backend.finish(job, error=str(e) or type(e).__name__)
+        return backend.finish(job, result=result)
+
+
+job_workers = JobWorkers(count=getattr(settings, 'REWRITE_JOB_WORKERS', 1))
+
+
+def start_job_workers():
+    """Start this process's REWRITE_JOB_WORKERS job threads; called by ApiConfig.ready."""
+    if job_workers.count <= 0:
+        if isinstance(get_job_backend(), InMemoryJobBackend):
+            logger.warning("InMemoryJobBackend without REWRITE_JOB_WORKERS: rewrite jobs of this process never run.")
+        else:
+            logger.warning(
+                "REWRITE_JOB_WORKERS is 0: rewrites that miss the cache wait for `manage.py run_rewrite_jobs`."
+            )
+    job_workers.start()
+
+
+def submit_job(user_id, title, category, product_id=None):
+    """Queue a rewrite job; returns the Job, whose id the client polls."""
+    return get_job_backend().enqueue(new_job(user_id, title, category, product_id))
+
+
+async def wait_for_job(job_id, timeout):
+    """The job once finished, or as it stands after `timeout` seconds; for async views."""
+    backend = get_job_backend()
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await sync_to_async(backend.get)(job_id)
+        remaining = deadline - time.monotonic()
+        if job is None or job.status in ('done', 'failed') or remaining <= 0:
+            return job
+        await asyncio.sleep(min(backend.poll_interval, remaining))
+
+
+def serialize_job(job):
+    return {
+        'job_id': str(job.id),
+        'status': job.status,
+        'product_id': job.product_id,
+        'improved_desc': job.result,
+        'error': job.error,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    }
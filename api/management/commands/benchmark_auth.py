@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import decorators
+from orm.models import User
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark per-request token authentication with and without the verified-token cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        user = User.objects.first()
+        if user is None:
+            raise CommandError("Create at least one user first.")
+
+        iterations = options['iterations']
+        token = str(AccessToken.for_user(user))
+        request = RequestFactory().get('/api/auth/user', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        def verify_uncached():
+            AccessToken(token).payload
+
+        def verify_cached():
+            decorators.verify_access_token(token)
+
+        def authenticate_uncached():
+            decorators._verified_tokens.clear()
+            decorators.authenticate_request(request)
+
+        def authenticate_cached():
+            decorators.authenticate_request(request)
+
+        for label, func in (
+            ("token verification, before", verify_uncached),
+            ("token verification, after", verify_cached),
+            ("authenticate_request, before", authenticate_uncached),
+            ("authenticate_request, after", authenticate_cached),
+        ):
+            func()  # warm up
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            per_call_us = (time.perf_counter() - start) / iterations * 1e6
+            self.stdout.write(f"{label:<32} {per_call_us:8.1f} us/request")
@@ -0,0 +1,57 @@
+import random
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.geo import haversine, haversine_many
+
+
+class Command(BaseCommand):
+    help = "Benchmark the scalar Haversine list comprehension against the vectorized NumPy pass."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--radius', type=float, default=50)
+
+    def handle(self, *args, **options):
+        lat, lng, radius = 3.139, 101.6869, options['radius']
+        rng = random.Random(0)
+
+        for size in options['sizes']:
+            # Synthetic catalogue spread over roughly the size of Peninsular Malaysia
+            products = [
+                SimpleNamespace(id=i, lat=rng.uniform(1.0, 6.7), lng=rng.uniform(99.6, 104.5))
+                for i in range(size)
+            ]
+
+            def scalar():
+                return [
+                    product.id for product in products
+                    if haversine(lat, lng, float(product.lat), float(product.lng)) <= radius
+                ]
+
+            def vectorized():
+                ids = np.fromiter((p.id for p in products), dtype=np.int64, count=size)
+                lats = np.fromiter((p.lat for p in products), dtype=np.float64, count=size)
+                lngs = np.fromiter((p.lng for p in products), dtype=np.float64, count=size)
+                return ids[haversine_many(lat, lng, lats, lngs) <= radius].tolist()
+
+            assert sorted(scalar()) == sorted(vectorized())
+
+            scalar_ms = self._best_of(scalar, options['repeat'])
+            vectorized_ms = self._best_of(vectorized, options['repeat'])
+            self.stdout.write(
+                f"{size:>7} products | list comprehension {scalar_ms:9.2f} ms"
+                f" | numpy {vectorized_ms:8.2f} ms | x{scalar_ms / vectorized_ms:.1f}"
+            )
+
+    def _best_of(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
@@ -0,0 +1,63 @@
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+from rest_framework.renderers import JSONRenderer
+
+from _applibs.renderers import FastJSONRenderer
+from _applibs.response import Messages
+from api.serializers import ProductSerializer
+from orm.models import Product, User
+
+
+class Command(BaseCommand):
+    help = "Compare JSONRenderer and FastJSONRenderer on an echo() envelope of ProductSerializer rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        user = User.objects.first()
+        if user is None:
+            raise CommandError("Create at least one user first.")
+
+        rows, iterations = options['rows'], options['iterations']
+        created_at = now()
+        # Unsaved products, so the benchmark needs no fixture data
+        products = [
+            Product(
+                id=i, title=f"Product {i}", description="Recycled material   in bulk",
+                lat=Decimal('5.354800') + Decimal(i % 80), lng=Decimal('100.301200'), location="Penang",
+                category='metal', quantity=i, unit='kilogram', price=Decimal('12.50') + i,
+                product_status='listed', created_by=user,
+                created_at=created_at - timedelta(minutes=i), updated_at=created_at,
+            )
+            for i in range(1, rows + 1)
+        ]
+        serialized = ProductSerializer(products, many=True).data
+
+        # Serializer output plus the native Decimal/datetime values echo() may be handed directly
+        payload = {'message': Messages.SUCCESS, 'data': {
+            'products': serialized,
+            'raw': [{'price': p.price, 'lat': p.lat, 'created_at': p.created_at} for p in products],
+        }}
+
+        baseline = JSONRenderer().render(payload)
+        fast = FastJSONRenderer().render(payload)
+        if json.loads(baseline) != json.loads(fast):
+            raise CommandError("FastJSONRenderer output differs from JSONRenderer.")
+
+        results = {}
+        for label, renderer in (("JSONRenderer", JSONRenderer()), ("FastJSONRenderer", FastJSONRenderer())):
+            renderer.render(payload)  # warm up
+            start = time.perf_counter()
+            for _ in range(iterations):
+                renderer.render(payload)
+            results[label] = (time.perf_counter() - start) / iterations * 1000
+            self.stdout.write(f"{label:<18} {results[label]:8.2f} ms/response ({len(baseline) / 1024:.0f} KiB)")
+
+        self.stdout.write(f"Speedup: {results['JSONRenderer'] / results['FastJSONRenderer']:.1f}x")
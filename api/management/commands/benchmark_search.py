@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from orm import fulltext
+from orm.models import Product
+
+
+class Command(BaseCommand):
+    help = "Compare the old title__icontains product search with the full-text search."
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', default=['metal', 'pap', 'recycled copper', 'p12'])
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=50, help="Rows fetched per search, like a results page.")
+
+    def handle(self, *args, **options):
+        if not Product.objects.exists():
+            raise CommandError("Create some products first.")
+
+        iterations, limit = options['iterations'], options['limit']
+        backend = fulltext.backend(connection)
+        self.stdout.write(f"{Product.objects.count()} products, full-text backend: {backend}")
+
+        for query in options['queries']:
+            results = []
+            for label, build in (
+                ("icontains", lambda: Product.objects.filter(title__icontains=query).order_by('-created_at')),
+                (backend, lambda: Product.objects.search(query)),
+            ):
+                list(build()[:limit])  # warm up
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    rows = list(build()[:limit])
+                elapsed = (time.perf_counter() - start) / iterations * 1000
+                results.append(f"{label} {elapsed:7.2f} ms ({build().count()} matches)")
+            self.stdout.write(f"{query!r:<20} " + "   ".join(results))
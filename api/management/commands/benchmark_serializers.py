@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import fast_serialize
+from api.serializers import MessageSerializer, OrderSerializer, ProductSerializer
+from orm.models import Message, Order, Product, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that fast_serialize output is byte-identical to the DRF serializers on the "
+        "list querysets of this database, then time both (api.tests.FastSerializerEquivalenceTests "
+        "checks the same on fixtures)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=5)
+
+    def handle(self, *args, **options):
+        user = User.objects.first()
+        if user is None:
+            raise CommandError("Create at least one user first.")
+
+        request = RequestFactory().get('/api/products', SERVER_NAME='localhost')
+        request.user = user
+        context = {'request': request}
+        rows, iterations = options['rows'], options['iterations']
+        renderer = JSONRenderer()
+        failures = 0
+
+        for serializer_class, queryset in (
+            (ProductSerializer, Product.objects.select_related('created_by').order_by('-created_at')),
+            (OrderSerializer, Order.objects.select_related('user', 'seller', 'product__created_by').order_by('-created_at')),
+            (MessageSerializer, Message.objects.select_related(
+                'sender', 'recipient', 'conversation__user1', 'conversation__user2').order_by('-created_at')),
+        ):
+            instances = list(queryset[:rows])
+            name = serializer_class.__name__
+            if not instances:
+                self.stdout.write(f"{name:<18} no rows, skipped")
+                continue
+
+            expected = renderer.render(serializer_class(instances, many=True, context=context).data)
+            actual = renderer.render(fast_serialize(serializer_class, instances, many=True, context=context))
+            if expected != actual:
+                failures += 1
+                self.stderr.write(f"{name:<18} output differs from the DRF serializer")
+                continue
+
+            timings = []
+            for func in (
+                lambda: serializer_class(instances, many=True, context=context).data,
+                lambda: fast_serialize(serializer_class, instances, many=True, context=context),
+            ):
+                func()  # warm up
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    func()
+                timings.append((time.perf_counter() - start) / iterations * 1000)
+            self.stdout.write(
+                f"{name:<18} {len(instances):>6} rows  identical  "
+                f"DRF {timings[0]:8.2f} ms  fast {timings[1]:8.2f} ms  ({timings[0] / timings[1]:.1f}x)"
+            )
+
+        if failures:
+            raise CommandError(f"{failures} serializer(s) produced different output.")
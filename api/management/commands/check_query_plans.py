@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from orm.models import ConversationSummary, Message, Order, Product
+
+
+def hot_queries():
+    """The per-request queries of the chat and order pages, with placeholder ids."""
+    return {
+        'message unread for recipient': Message.objects.filter(conversation_id=1, recipient_id=1, is_read=False),
+        'message history page': Message.objects.filter(conversation_id=1).order_by('-created_at')[:10],
+        'order purchases': Order.objects.filter(user_id=1).order_by('-created_at'),
+        'order sales': Order.objects.filter(seller_id=1).order_by('-created_at'),
+        'product owner listing': Product.objects.filter(created_by=1).order_by('-created_at'),
+        'conversation inbox': ConversationSummary.objects.filter(user_id=1).order_by('-last_message_at'),
+    }
+
+
+def explain(queryset):
+    """Return (plan lines, full scan found) for the queryset on the current database."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            details = [row[-1] for row in cursor.fetchall()]
+            # "SCAN <table>" without an index is a full table scan
+            full_scan = any(d.startswith('SCAN') and 'INDEX' not in d for d in details)
+            return details, full_scan
+
+        if connection.vendor == 'mysql':
+            cursor.execute(f"EXPLAIN {sql}", params)
+            columns = [col[0] for col in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            details = [f"{row['table']}: type={row['type']} key={row['key']} extra={row['Extra']}" for row in rows]
+            # Access type ALL is a full table scan
+            full_scan = any(row['type'] == 'ALL' for row in rows)
+            return details, full_scan
+
+    raise CommandError(f"Query plan checks are not supported on {connection.vendor}.")
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the chat and order hot queries and fail if any of them falls back to a full table "
+        "scan. api.tests.QueryPlanTests runs the same check on the test database; this one checks "
+        "the plans against real data."
+    )
+
+    def handle(self, *args, **options):
+        failures = []
+        for name, queryset in hot_queries().items():
+            details, full_scan = explain(queryset)
+            style = self.style.ERROR if full_scan else self.style.SUCCESS
+            self.stdout.write(style(f"{'FULL SCAN' if full_scan else 'ok':<9} {name}"))
+            for line in details:
+                self.stdout.write(f"          {line}")
+            if full_scan:
+                failures.append(name)
+
+        if failures:
+            raise CommandError(f"Full table scan in: {', '.join(failures)}")
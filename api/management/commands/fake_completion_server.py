@@ -0,0 +1,115 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class FakeCompletionServer(ThreadingHTTPServer):
+    """
+    A stand-in for the OpenAI chat completions API, answering
+    POST /v1/chat/completions after `delay` seconds with a canned completion that
+    echoes the prompt. GET /stats returns how many completions were requested, and
+    the most that were answered at once.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, delay=0.0, fail_every=0):
+        super().__init__(address, FakeCompletionHandler)
+        self.delay = delay
+        self.fail_every = fail_every
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.active = self.max_active = 0
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up on a slow answer (timeouts) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class FakeCompletionHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') != '/stats':
+            return self.send_json(404, {'error': {'message': 'Not found'}})
+        self.send_json(200, {'requests': self.server.requests, 'max_active': self.server.max_active})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self.send_json(400, {'error': {'message': 'Invalid JSON'}})
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            return self.send_json(404, {'error': {'message': 'Not found'}})
+
+        with self.server.lock:
+            self.server.requests += 1
+            number = self.server.requests
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        try:
+            time.sleep(self.server.delay)
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+        if self.server.fail_every and number % self.server.fail_every == 0:
+            return self.send_json(500, {'error': {'message': 'Simulated upstream failure'}})
+
+        prompt = next((m.get('content', '') for m in reversed(body.get('messages', [])) if m.get('role') == 'user'), '')
+        content = f"Fake rewrite #{number}: {' '.join(prompt.split())[:200]}"
+        self.send_json(200, {
+            'id': f'chatcmpl-fake-{number}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(content.split()),
+                      'total_tokens': len(prompt.split()) + len(content.split())},
+        })
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local fake OpenAI chat completions server for trying out and load-testing the "
+        "description rewrite endpoint without an API key. Point the app at it with "
+        "OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 (and any OPENAI_API_KEY)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--delay', type=float, default=1.0, help="Seconds before each answer.")
+        parser.add_argument('--fail-every', type=int, default=0, help="Answer every Nth request with a 500.")
+
+    def handle(self, *args, **options):
+        server = FakeCompletionServer((options['host'], options['port']), options['delay'], options['fail_every'])
+        self.stdout.write(f"Fake completions at {server.base_url} (delay {options['delay']:g}s); Ctrl+C to stop")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.images import IMAGE_FIELDS, image_pipeline
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the thumbnail and WebP variants of product and profile images that don't "
+        "have them yet (uploads made before the image pipeline, or after changing "
+        "IMAGE_VARIANT_SIZES with --all)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Regenerate existing variants too.")
+
+    def handle(self, *args, **options):
+        for model, field_name in IMAGE_FIELDS.items():
+            rows = model.objects.exclude(**{f'{field_name}__isnull': True}).exclude(**{field_name: ''})
+            done = failed = skipped = 0
+            for pk, name, variants in rows.values_list('pk', field_name, 'image_variants').iterator():
+                if not options['all'] and (variants or {}).get('source') == name:
+                    skipped += 1
+                    continue
+                try:
+                    image_pipeline.process(model, pk, name)
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} {pk} ({name}): {e}")
+            self.stdout.write(f"{model.__name__}: {done} generated, {skipped} up to date, {failed} failed")
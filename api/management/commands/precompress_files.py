@@ -0,0 +1,57 @@
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.media import COMPRESSIBLE_TYPES
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Write .gz (and .br, when the brotli package is installed) siblings of the "
+        "compressible files under STATIC_ROOT and MEDIA_ROOT, which api.media.serve sends "
+        "to clients accepting that encoding. Run it after collectstatic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-size', type=int, default=512, help="Skip files smaller than this (bytes).")
+
+    def handle(self, *args, **options):
+        written = skipped = 0
+        for root in (settings.STATIC_ROOT, settings.MEDIA_ROOT):
+            if not root or not os.path.isdir(root):
+                continue
+            for directory, _, filenames in os.walk(root):
+                for filename in filenames:
+                    path = os.path.join(directory, filename)
+                    content_type, encoding = mimetypes.guess_type(path)
+                    if encoding or not content_type or not COMPRESSIBLE_TYPES.match(content_type):
+                        continue
+                    if os.path.getsize(path) < options['min_size']:
+                        continue
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    for suffix, compress in self.compressors():
+                        target = path + suffix
+                        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                            skipped += 1
+                            continue
+                        compressed = compress(data)
+                        if len(compressed) >= len(data):
+                            continue
+                        with open(target, 'wb') as f:
+                            f.write(compressed)
+                        written += 1
+        self.stdout.write(self.style.SUCCESS(f"{written} compressed files written, {skipped} up to date"))
+
+    def compressors(self):
+        yield '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+        if brotli is not None:
+            yield '.br', lambda data: brotli.compress(data, quality=11)
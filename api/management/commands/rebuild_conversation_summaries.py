@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orm.models import ConversationSummary
+
+
+class Command(BaseCommand):
+    help = "Rebuild the conversation summary rows from the messages table (backfill and drift repair)."
+
+    def handle(self, *args, **options):
+        total = ConversationSummary.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} conversation summaries."))
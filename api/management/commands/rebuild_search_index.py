@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from orm import fulltext
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreate the product full-text index. Needed on SQLite after a migration rebuilds "
+        "the product table (which drops the FTS5 triggers) or after raw bulk imports."
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'mysql':
+            self.stdout.write("MySQL maintains the FULLTEXT index itself; nothing to do.")
+            return
+        fulltext.uninstall(connection)
+        fulltext.install(connection)
+        self.stdout.write(self.style.SUCCESS(f"Search backend: {fulltext.backend(connection)}"))
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.jobs import JobWorkers
+
+
+class Command(BaseCommand):
+    help = (
+        "Work off queued AI description rewrite jobs (every rewrite that misses the cache). "
+        "With the database job backend, run one of these next to the web processes; --workers "
+        "caps the concurrent upstream calls across every caller."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.REWRITE_MAX_CONCURRENCY)
+
+    def handle(self, *args, **options):
+        workers = JobWorkers(count=options['workers'])
+        workers.start()
+        self.stdout.write(f"Running {options['workers']} rewrite job workers; Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the current jobs...")
+            workers.stop()
@@ -0,0 +1,189 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+# Names that are never reused for other content: the uuid names given to uploads, content
+# hashes (api.images variants, ManifestStaticFilesStorage's name.0123abcd4567.css)
+IMMUTABLE_NAME_RE = re.compile(
+    r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|(?<![0-9a-z])[0-9a-f]{12,}(?![0-9a-z])'
+)
+
+# Precompressed siblings (`file.br`, `file.gz`), in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Types worth precompressing; images and fonts are compressed already
+COMPRESSIBLE_TYPES = re.compile(r'^(text/|application/(javascript|json|xml|manifest\+json)|image/svg\+xml)')
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def is_immutable(path):
+    return IMMUTABLE_NAME_RE.search(os.path.basename(path)) is not None
+
+
+def accepted_encodings(request):
+    header = request.headers.get('Accept-Encoding', '')
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def parse_range(header, size):
+    """
+    The (start, end) inclusive byte range of a single-range `Range` header, None when
+    the header should be ignored (absent, malformed, several ranges), or False when
+    it can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # The last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        return False
+    if start > end:
+        return None
+    return start, end
+
+
+def _iter_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+@require_safe
+def serve(request, path, document_root, url_prefix=''):
+    """
+    Serve a file of `document_root`, for MEDIA_ROOT and STATIC_ROOT in place of
+    django.views.static.serve.
+
+    - Files with unique names (see IMMUTABLE_NAME_RE) are cached for a year as
+      immutable; others for MEDIA_CACHE_MAX_AGE seconds, then revalidated with their
+      ETag / Last-Modified.
+    - A `.br` or `.gz` sibling is sent instead when the client accepts that encoding
+      (see the precompress_files command).
+    - With MEDIA_SENDFILE_BACKEND set, only the headers are built here and the front
+      server sends the body (`x-sendfile` for Apache/lighttpd, `x-accel-redirect` for
+      nginx, under MEDIA_ACCEL_REDIRECT_LOCATION + url_prefix + path); it also
+      answers Range requests itself. Otherwise single byte ranges are answered here.
+    """
+    try:
+        fullpath = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat_result = os.stat(fullpath)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+    send_path, content_encoding = fullpath, encoding
+    range_header = request.headers.get('Range')
+
+    if encoding is None and not range_header and COMPRESSIBLE_TYPES.match(content_type):
+        accepted = accepted_encodings(request)
+        for coding, suffix in ENCODINGS:
+            if coding in accepted:
+                try:
+                    compressed_stat = os.stat(fullpath + suffix)
+                except FileNotFoundError:
+                    continue
+                # A stale sibling is worse than none
+                if compressed_stat.st_mtime >= stat_result.st_mtime:
+                    send_path, content_encoding, stat_result = fullpath + suffix, coding, compressed_stat
+                    break
+
+    size = stat_result.st_size
+    last_modified = int(stat_result.st_mtime)
+    etag = quote_etag(f"{stat_result.st_mtime_ns:x}-{size:x}{'-' + content_encoding if content_encoding else ''}")
+
+    def finish(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Accept-Ranges'] = 'bytes'
+        if COMPRESSIBLE_TYPES.match(content_type):
+            patch_vary_headers(response, ('Accept-Encoding',))
+        if is_immutable(path):
+            patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+        else:
+            patch_cache_control(response, public=True, max_age=getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600))
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return finish(not_modified)
+
+    backend = getattr(settings, 'MEDIA_SENDFILE_BACKEND', None)
+    if backend:
+        response = HttpResponse(content_type=content_type)
+        if backend == 'x-accel-redirect':
+            location = getattr(settings, 'MEDIA_ACCEL_REDIRECT_LOCATION', '/_protected/')
+            relative = os.path.relpath(send_path, document_root).replace(os.sep, '/')
+            response['X-Accel-Redirect'] = f"{location.rstrip('/')}/{url_prefix}{relative}"
+        else:
+            response['X-Sendfile'] = send_path
+        if content_encoding:
+            response['Content-Encoding'] = content_encoding
+        return finish(response)
+
+    byte_range = parse_range(range_header, size) if range_header else None
+    if byte_range is not None:
+        if_range = request.headers.get('If-Range')
+        # A range of an older version of the file is no use to the client
+        if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+            byte_range = None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return finish(response)
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = str(size)
+    elif byte_range is not None:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _iter_range(open(send_path, 'rb'), start, end - start + 1), status=206, content_type=content_type
+        )
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        response = FileResponse(open(send_path, 'rb'), content_type=content_type)
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    return finish(response)
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def user_channel(user_id):
+    """The channel carrying every chat event addressed to one user."""
+    return f"user.{user_id}"
+
+
+class Subscription:
+    """A consumer of one channel, bound to the event loop it was opened on."""
+
+    def __init__(self, broker, channel, max_pending=100):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+
+    async def get(self, timeout=None):
+        """Return the next event, or None when `timeout` seconds passed first."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def deliver(self, event):
+        """Called by the broker from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The subscriber's event loop has already been closed
+            pass
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: drop the event rather than grow without bound
+            pass
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BaseBroker:
+    """
+    Pub/sub interface behind the chat long-poll and WebSocket transports.
+
+    Events are JSON-serializable dicts. `publish` may be called from any thread (sync
+    views); `subscribe` is called from a coroutine and returns a Subscription. A backend
+    that relays events between processes (for example over a Redis-like server) only
+    has to implement these three methods to let several workers share one chat.
+    """
+
+    def publish(self, channel, event):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InMemoryBroker(BaseBroker):
+    """Fan-out within the current process; enough for a single ASGI worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker selected by settings.CHAT_BROKER_BACKEND."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.CHAT_BROKER_BACKEND)()
+    return _broker
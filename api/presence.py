@@ -0,0 +1,123 @@
+import atexit
+import logging
+import threading
+from datetime import timedelta
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.timezone import now
+
+from orm.models import User
+
+logger = logging.getLogger(__name__)
+
+# A user counts as online when their last heartbeat is at most this old
+ACTIVE_WINDOW = timedelta(seconds=30)
+
+
+def is_recent(last_active, at=None):
+    """The 30-second rule shared by the presence endpoints and UserActivitySerializer."""
+    if last_active is None:
+        return False
+    return ((at or now()) - last_active) <= ACTIVE_WINDOW
+
+
+def newest(*timestamps):
+    return max((timestamp for timestamp in timestamps if timestamp is not None), default=None)
+
+
+class PresenceStore:
+    """
+    Last-seen timestamps kept in memory instead of a full-row User save per heartbeat.
+
+    Heartbeats only touch a TTL cache. A background thread, started by the first
+    heartbeat, writes them to User.last_active in one batched bulk_update every
+    PRESENCE_FLUSH_INTERVAL seconds (and once more at exit), so the database copy
+    other workers read lags by that much. Lookups return the newer of this process's
+    timestamp and the database one, since the user may heartbeat on another worker.
+    """
+
+    def __init__(self, max_users, ttl, flush_interval):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._last_seen = TTLCache(maxsize=max_users, ttl=ttl)
+        self._pending = {}
+        self._flusher = None
+        self._stopping = threading.Event()
+
+    def touch(self, user_id):
+        """Record a heartbeat; returns its timestamp."""
+        seen_at = now()
+        with self._lock:
+            self._last_seen[user_id] = seen_at
+            self._pending[user_id] = seen_at
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_periodically, name='presence-flush', daemon=True)
+                self._flusher.start()
+        return seen_at
+
+    def peek(self, user_id, last_active=None):
+        """
+        The newer of the in-memory last-seen timestamp and `last_active` (the user's
+        database value, when the caller has it), without touching the database.
+        """
+        with self._lock:
+            return newest(self._last_seen.get(user_id), last_active)
+
+    def last_seen_many(self, user_ids):
+        """
+        Map each existing user id to its last-seen timestamp (None if never seen),
+        read with a single `id__in` query; unknown ids are left out.
+        """
+        result = dict(User.objects.filter(id__in=user_ids).values_list('id', 'last_active'))
+        with self._lock:
+            for user_id, last_active in result.items():
+                result[user_id] = newest(self._last_seen.get(user_id), last_active)
+        return result
+
+    def is_active_many(self, user_ids):
+        """Map each existing user id to whether it is currently active."""
+        at = now()
+        return {user_id: is_recent(seen_at, at) for user_id, seen_at in self.last_seen_many(user_ids).items()}
+
+    def stop(self):
+        """Stop the flush thread and write the heartbeats it has not flushed yet."""
+        self._stopping.set()
+        self.flush()
+
+    def _flush_periodically(self):
+        while not self._stopping.wait(self.flush_interval):
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write the pending heartbeats to User.last_active in one batched update."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        users = [User(id=user_id, last_active=seen_at, is_active_user=True) for user_id, seen_at in pending.items()]
+        try:
+            User.objects.bulk_update(users, ['last_active', 'is_active_user'], batch_size=500)
+        except Exception as e:
+            logger.exception(f"Failed to flush presence for {len(users)} users: {e}")
+            # Keep the heartbeats for the next flush unless newer ones arrived meanwhile
+            with self._lock:
+                for user_id, seen_at in pending.items():
+                    self._pending.setdefault(user_id, seen_at)
+            return 0
+        return len(users)
+
+
+presence = PresenceStore(
+    max_users=getattr(settings, 'PRESENCE_MAX_USERS', 100000),
+    ttl=getattr(settings, 'PRESENCE_TTL', 300),
+    flush_interval=getattr(settings, 'PRESENCE_FLUSH_INTERVAL', 10),
+)
+
+# Don't lose the last batch of heartbeats on a clean shutdown
+atexit.register(presence.stop)
@@ -0,0 +1,53 @@
+import copy
+import threading
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from orm.models import User
+from .catalogue import catalogue_version
+
+_lock = threading.Lock()
+_principals = TTLCache(
+    maxsize=getattr(settings, 'PRINCIPAL_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'PRINCIPAL_CACHE_TTL', 60),
+)
+
+
+def get_principal(user_id):
+    """
+    The authenticated user for `user_id`, or None if it does not exist.
+
+    Users are cached per process for PRINCIPAL_CACHE_TTL seconds, so the token
+    decorators don't query the users table on every request. Entries are dropped on
+    save or delete in this process, and kept only for the catalogue version they were
+    read at (api.catalogue), which every User save or delete bumps: other workers drop
+    them within CATALOGUE_VERSION_RELOAD_INTERVAL seconds. Queryset updates of users
+    send no signal and show after the TTL. Each call returns its own copy, so a view
+    may modify and save it safely.
+    """
+    version = catalogue_version()
+    with _lock:
+        entry = _principals.get(user_id)
+    if entry is not None and entry[1] == version:
+        user = entry[0]
+    else:
+        user = User.objects.filter(id=user_id).first()
+        if user is None:
+            return None
+        with _lock:
+            _principals[user_id] = (user, version)
+    return copy.copy(user)
+
+
+def invalidate_principal(user_id):
+    with _lock:
+        _principals.pop(user_id, None)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _invalidate_on_change(sender, instance, **kwargs):
+    invalidate_principal(instance.id)
@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils.timezone import now
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from orm.models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+
+class RevokedTokenSet:
+    """
+    In-memory copy of the revoked refresh token ids, so refreshing an access token
+    never has to query the database.
+
+    The set is loaded on first use, updated directly on logout in this process, and picks
+    up tokens revoked by other workers with one incremental query at most every
+    REVOKED_TOKENS_RELOAD_INTERVAL seconds. Each reload re-reads the revocations created
+    up to REVOKED_TOKENS_RELOAD_OVERLAP seconds before the previous one started, so a row
+    that committed late (or came from a worker whose clock lags) is not skipped. Ids are
+    forgotten once their token expires.
+    """
+
+    def __init__(self, reload_interval, reload_overlap):
+        self.reload_interval = reload_interval
+        self.reload_overlap = reload_overlap
+        self._lock = threading.Lock()
+        self._revoked = {}  # jti -> expiry (epoch seconds)
+        self._loaded_at = None  # now() when the last reload started
+        self._last_reload = None
+
+    def is_revoked(self, jti):
+        self._reload_if_due()
+        with self._lock:
+            return jti in self._revoked
+
+    def revoke(self, token):
+        """Revoke a RefreshToken, persisting it so every worker learns about it."""
+        jti, exp = token[api_settings.JTI_CLAIM], token['exp']
+        RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': datetime_from_epoch(exp)})
+        with self._lock:
+            self._revoked[jti] = exp
+
+    def _reload_if_due(self):
+        with self._lock:
+            if self._last_reload is not None and time.monotonic() - self._last_reload < self.reload_interval:
+                return
+            self._last_reload = time.monotonic()
+            loaded_at = self._loaded_at
+
+        started = now()
+        revoked = RevokedToken.objects.filter(expires_at__gt=started)
+        if loaded_at is not None:
+            revoked = revoked.filter(created_at__gte=loaded_at - timedelta(seconds=self.reload_overlap))
+        try:
+            rows = list(revoked.values_list('jti', 'expires_at'))
+        except Exception as e:
+            logger.exception(f"Failed to load revoked tokens: {e}")
+            return
+
+        current_time = time.time()
+        with self._lock:
+            for jti, expires_at in rows:
+                self._revoked[jti] = expires_at.timestamp()
+            self._loaded_at = started
+            # Expired tokens are rejected anyway, no need to remember them
+            for jti in [jti for jti, exp in self._revoked.items() if exp <= current_time]:
+                del self._revoked[jti]
+
+
+revoked_tokens = RevokedTokenSet(
+    reload_interval=getattr(settings, 'REVOKED_TOKENS_RELOAD_INTERVAL', 60),
+    reload_overlap=getattr(settings, 'REVOKED_TOKENS_RELOAD_OVERLAP', 300),
+)
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+
+import httpx
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils.timezone import now
+from openai import AsyncOpenAI
+
+from orm.models import DescriptionRewrite
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = (
+    "You are an AI assistant specializing in waste management and environmental sustainability. "
+    "Your task is to analyze waste descriptions and provide recommendations for repurposing or disposal."
+)
+
+# Bump to stop serving rewrites cached for an older prompt
+PROMPT_VERSION = 1
+
+
+def build_prompt(title):
+    return f"""
+        Analyze the following waste: "{title}". Provide the following details:
+        1. What type of waste is it?
+        2. What can it be repurposed or made into?
+        3. How should it be disposed of properly (recycled, composted, or other)?
+        """
+
+
+def normalize(value):
+    """Case- and whitespace-insensitive form of a prompt input."""
+    return ' '.join(value.split()).casefold()
+
+
+def cache_key(title, category, model):
+    raw = '\0'.join([str(PROMPT_VERSION), model, normalize(title), normalize(category)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class RewriteTimeout(Exception):
+    pass
+
+
+class DescriptionRewriter:
+    """
+    Rewrites product descriptions with the OpenAI API. Views only `lookup` the cache;
+    the rest is called by the job workers (api.jobs).
+
+    Upstream calls run on one event loop thread per process that owns an AsyncOpenAI
+    client, so every worker thread shares its connection pool. Concurrent calls with
+    the same cache key share one upstream request, at most REWRITE_MAX_CONCURRENCY
+    requests are sent at once, and a call (queueing included) fails with
+    RewriteTimeout after REWRITE_TIMEOUT seconds. Answers are kept
+    in the DescriptionRewrite table, so a title is only sent upstream once.
+    """
+
+    def __init__(self, max_concurrency, timeout):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+        self._inflight = {}  # cache key -> asyncio.Task, touched on the owner loop only
+        self.upstream_calls = self.coalesced_calls = 0
+
+    @property
+    def model(self):
+        return getattr(settings, 'OPENAI_REWRITE_MODEL', 'gpt-4o-mini')
+
+    # Callers
+
+    async def lookup(self, title, category):
+        """The cached rewrite of this title and category, or None; never calls upstream."""
+        key = cache_key(title, category, self.model)
+        return await self._fresh(DescriptionRewrite.objects.filter(key=key)).values_list('content', flat=True).afirst()
+
+    def rewrite(self, title, category):
+        """
+        The rewritten description and whether it came from the cache; blocks, so it is
+        called from the job worker threads rather than the event loop.
+        """
+        key = cache_key(title, category, self.model)
+        cached = self._fresh(DescriptionRewrite.objects.filter(key=key)).values_list('content', flat=True).first()
+        if cached is not None:
+            return cached, True
+        content = self.submit(key, title).result()
+        try:
+            DescriptionRewrite.objects.update_or_create(key=key, defaults=self._row(title, category, content))
+        except DatabaseError as e:
+            logger.warning(f"Failed to cache a description rewrite: {e}")
+        return content, False
+
+    def submit(self, key, title):
+        """Start (or join) the upstream call for `key`; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(self._coalesced(key, title), self._get_loop())
+
+    def _fresh(self, queryset):
+        max_age = getattr(settings, 'REWRITE_CACHE_MAX_AGE', 30 * 24 * 60 * 60)
+        return queryset.filter(created_at__gte=now() - timedelta(seconds=max_age)) if max_age else queryset
+
+    def _row(self, title, category, content):
+        return {
+            'title': title[:255], 'category': category[:50], 'model': self.model,
+            'content': content, 'created_at': now(),
+        }
+
+    # Owner loop
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='rewrite-loop', daemon=True)
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    async def _coalesced(self, key, title):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._complete(title))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced_calls += 1
+        # One caller giving up must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _complete(self, title):
+        if self._client is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._client = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=getattr(settings, 'OPENAI_BASE_URL', None),
+                timeout=self.timeout,
+                max_retries=1,
+                http_client=httpx.AsyncClient(limits=httpx.Limits(
+                    max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency,
+                )),
+            )
+        try:
+            return await asyncio.wait_for(self._request(title), self.timeout)
+        except asyncio.TimeoutError:
+            raise RewriteTimeout(f"No answer within {self.timeout:g} seconds.")
+
+    async def _request(self, title):
+        async with self._semaphore:
+            self.upstream_calls += 1
+            completion = await self._client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "developer", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": build_prompt(title)},
+                ],
+            )
+        return completion.choices[0].message.content
+
+
+rewriter = DescriptionRewriter(
+    max_concurrency=getattr(settings, 'REWRITE_MAX_CONCURRENCY', 8),
+    timeout=getattr(settings, 'REWRITE_TIMEOUT', 30),
+)
@@ -1,24 +1,26 @@
 from rest_framework import serializers
 from orm.models import User,Product,Order,Conversation,Message
 from django.contrib.auth.hashers import make_password
-from drf_extra_fields.fields import Base64ImageField
-from django.utils.timezone import now
-from datetime import timedelta
+from api.presence import presence, is_recent
+from api.images import ImageVariantsField
+from api.uploads import ImageUploadField
 
 
 
 class UserSerializer(serializers.ModelSerializer):
+    profile_picture = ImageUploadField(required=False, allow_null=True)
+    profile_picture_variants = ImageVariantsField(source='image_variants')
+
     class Meta:
         model = User
         fields = [
             'id', 'name', 'email','address','postal_code','state','phone_number','country',
             'is_active', 'date_joined', 
-            'profile_picture'
+            'profile_picture', 'profile_picture_variants'
         ]
         extra_kwargs = {
             'remember_token': {'read_only': False},  # Make token read-only
             'remember_token_created_at': {'read_only': True},  # Make token timestamp read-only
-            'profile_picture': {'required': False, 'allow_null': True},  # Optional field
         }
 
 class UserActivitySerializer(serializers.ModelSerializer):
@@ -29,9 +31,9 @@ class UserActivitySerializer(serializers.ModelSerializer):
 
     def get_is_currently_active(self, obj):
         """Determine if the user is currently active."""
-        if obj.last_active:
-            return (now() - obj.last_active) <= timedelta(seconds=30)
-        return False
+        # The in-memory heartbeat is fresher than the batched `last_active`, unless the
+        # user's heartbeats go to another worker
+        return is_recent(presence.peek(obj.id, obj.last_active))
     
 class AuthSerializer(serializers.Serializer):
     code = serializers.CharField(required=True)
@@ -56,12 +58,13 @@ class ProductSerializer(serializers.ModelSerializer):
     created_by_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), source='created_by', write_only=True
     )  # Write-only user ID
-    image = Base64ImageField(required=True)
+    image = ImageUploadField(required=True)  # base64 in JSON, or a multipart file
+    image_variants = ImageVariantsField()  # Thumbnails for listings, filled in shortly after upload
 
     class Meta:
         model = Product
         fields = [
-            'id', 'title', 'image', 'description', 'lat', 'lng', 'location',
+            'id', 'title', 'image', 'image_variants', 'description', 'lat', 'lng', 'location',
             'category', 'quantity', 'unit', 'price', 'product_status',
             'created_by', 'created_by_id', 'created_at', 'updated_at'
         ]
@@ -144,6 +147,9 @@ class GetUserConversationsSerializer(serializers.ModelSerializer):
 
     def get_latest_message_content(self, obj):
         """Serialize the latest message content."""
+        # Annotated by Conversation.objects.inbox_for
+        if hasattr(obj, 'latest_message_text'):
+            return obj.latest_message_text
         return obj.latest_message if hasattr(obj, 'latest_message') else None
 
     def get_unread_messages_count(self, obj):
@@ -152,6 +158,9 @@ class GetUserConversationsSerializer(serializers.ModelSerializer):
         session_user = getattr(request, 'user', None)  # Safely access the user from the request
 
         if session_user:
+            # Annotated by Conversation.objects.inbox_for
+            if hasattr(obj, 'unread_count'):
+                return obj.unread_count
             return obj.messages.filter(recipient_id=session_user.id, is_read=False).count()
         return 0
 
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import models
+from django.http import parse_cookie
+
+from orm.models import Conversation
+from .decorators import authenticate_access_token
+from .notifications import get_broker, user_channel
+from .views.conversations import create_message, mark_conversation_read
+
+logger = logging.getLogger(__name__)
+
+
+def conversation_partner_ids(user_id):
+    """Ids of every user the given user has a conversation with."""
+    partner_ids = set()
+    pairs = Conversation.objects.filter(
+        models.Q(user1_id=user_id) | models.Q(user2_id=user_id)
+    ).values_list('user1_id', 'user2_id')
+    for user1_id, user2_id in pairs:
+        partner_ids.update((user1_id, user2_id))
+    return partner_ids - {user_id, None}
+
+
+class ChatSocket:
+    """
+    Full-duplex chat transport at /ws/chat, routed by wastex.asgi.
+
+    Browsers authenticate with the `access` cookie; handshakes from pages whose Origin
+    is not in CHAT_SOCKET_ALLOWED_ORIGINS are refused, so another site can't open a
+    socket as its visitor. Other clients connect without the cookie and send their
+    access token in the first frame, within AUTH_TIMEOUT seconds:
+
+        -> {"type": "auth", "token": "<access token>"}
+
+    then both sides exchange JSON frames:
+
+        -> {"type": "message", "conversation_id": 1, "recipient_id": 2, "content": "hi"}
+        -> {"type": "read", "conversation_id": 1}
+        -> {"type": "typing", "conversation_id": 1}
+        <- {"type": "message", "message": {...}}   (same payload as MessageAPIView.post)
+        <- {"type": "read", "conversation_id": 1, "reader_id": 2}
+        <- {"type": "typing", "conversation_id": 1, "user_id": 2}
+        <- {"type": "presence", "user_id": 2, "online": true}
+        <- {"type": "error", "errors": ...}
+
+    Messages are persisted through create_message, the same code path as MessageAPIView.post,
+    and every event is fanned out through the configured chat broker.
+    """
+
+    AUTH_TIMEOUT = 10
+
+    async def __call__(self, scope, receive, send):
+        event = await receive()
+        if event['type'] != 'websocket.connect':
+            return
+
+        headers = dict(scope.get('headers', []))
+        origin = headers.get(b'origin', b'').decode('latin-1')
+        if origin and origin not in settings.CHAT_SOCKET_ALLOWED_ORIGINS:
+            await send({'type': 'websocket.close', 'code': 4403})
+            return
+
+        token = parse_cookie(headers.get(b'cookie', b'').decode('latin-1')).get('access')
+        if token:
+            # Cookies come with any page's handshake; only trust them from a known page
+            if not origin:
+                await send({'type': 'websocket.close', 'code': 4403})
+                return
+            user, error = await sync_to_async(authenticate_access_token)(token)
+            if error:
+                await send({'type': 'websocket.close', 'code': 4401})
+                return
+            await send({'type': 'websocket.accept'})
+        else:
+            await send({'type': 'websocket.accept'})
+            user = await self.authenticate_first_frame(receive)
+            if user is None:
+                await send({'type': 'websocket.close', 'code': 4401})
+                return
+
+        send_lock = asyncio.Lock()
+
+        async def send_json(payload):
+            async with send_lock:
+                await send({'type': 'websocket.send', 'text': json.dumps(payload, default=str)})
+
+        broker = get_broker()
+        with broker.subscribe(user_channel(user.id)) as subscription:
+            forwarder = asyncio.create_task(self.forward(subscription, send_json))
+            partner_ids = await sync_to_async(conversation_partner_ids)(user.id)
+            self.publish_presence(partner_ids, user, True)
+            try:
+                while True:
+                    event = await receive()
+                    if event['type'] == 'websocket.disconnect':
+                        break
+                    if event['type'] == 'websocket.receive':
+                        try:
+                            await self.handle_frame(user, event.get('text') or event.get('bytes'), send_json)
+                        except Exception as e:
+                            logger.exception(f"Error handling chat frame from user {user.id}: {e}")
+                            await send_json({'type': 'error', 'errors': 'An error occurred.'})
+            finally:
+                forwarder.cancel()
+                self.publish_presence(partner_ids, user, False)
+
+    async def authenticate_first_frame(self, receive):
+        """The user of the `auth` frame the client must send first, or None."""
+        try:
+            event = await asyncio.wait_for(receive(), self.AUTH_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        if event['type'] != 'websocket.receive':
+            return None
+        try:
+            payload = json.loads(event.get('text') or event.get('bytes'))
+            token = payload.get('token') if payload.get('type') == 'auth' else None
+        except (TypeError, ValueError, AttributeError):
+            return None
+        if not token or not isinstance(token, str):
+            return None
+        user, error = await sync_to_async(authenticate_access_token)(token)
+        return None if error else user
+
+    async def forward(self, subscription, send_json):
+        """Relay broker events addressed to this user down the socket."""
+        while True:
+            event = await subscription.get()
+            if event is not None:
+                await send_json(event)
+
+    async def handle_frame(self, user, frame, send_json):
+        try:
+            payload = json.loads(frame)
+            event_type = payload.get('type')
+        except (TypeError, ValueError, AttributeError):
+            await send_json({'type': 'error', 'errors': 'Invalid frame.'})
+            return
+
+        if event_type == 'message':
+            data = {
+                'conversation_id': payload.get('conversation_id'),
+                'recipient_id': payload.get('recipient_id'),
+                'sender_id': user.id,
+                'content': payload.get('content'),
+            }
+            _, errors = await sync_to_async(create_message)(user, data)
+            if errors is not None:
+                await send_json({'type': 'error', 'errors': errors})
+            return
+
+        if event_type not in ('read', 'typing'):
+            await send_json({'type': 'error', 'errors': f"Unknown event type: {event_type}"})
+            return
+
+        conversation = await Conversation.objects.filter(
+            models.Q(user1_id=user.id) | models.Q(user2_id=user.id),
+            pk=payload.get('conversation_id'),
+        ).afirst()
+        if not conversation:
+            await send_json({'type': 'error', 'errors': 'Conversation not found.'})
+            return
+
+        if event_type == 'read':
+            await sync_to_async(mark_conversation_read)(conversation, user)
+        else:
+            other_user_id = conversation.user2_id if conversation.user1_id == user.id else conversation.user1_id
+            if other_user_id:
+                get_broker().publish(user_channel(other_user_id), {
+                    'type': 'typing', 'conversation_id': conversation.id, 'user_id': user.id
+                })
+
+    def publish_presence(self, partner_ids, user, online):
+        broker = get_broker()
+        for partner_id in partner_ids:
+            broker.publish(user_channel(partner_id), {'type': 'presence', 'user_id': user.id, 'online': online})
@@ -0,0 +1,705 @@
+import io
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from PIL import Image
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from api.catalogue import catalogue_cache, catalogue_version
+from api.views.conversations import is_incoming_message
+from api.fast_serializers import fast_serialize
+from api.images import render_variants, variant_names
+from api.jobs import job_workers, start_job_workers
+from api.presence import PresenceStore
+from api.principal import get_principal
+from api.media import is_immutable
+from api.management.commands.check_query_plans import explain, hot_queries
+from api.management.commands.fake_completion_server import FakeCompletionServer
+from api.revocation import RevokedTokenSet, revoked_tokens
+from api.rewrite import DescriptionRewriter, RewriteTimeout, cache_key
+from api.serializers import MessageSerializer, OrderSerializer, ProductSerializer
+from orm import fulltext
+from orm.models import CatalogueVersion, Conversation, ConversationSummary, Message, Order, Product, RevokedToken, User
+
+
+def create_user(name):
+    return User.objects.create(name=name, email=f'{name}@example.com')
+
+
+def create_product(user, **fields):
+    return Product.objects.create(**{
+        'title': 'Scrap copper', 'category': 'metal', 'quantity': 3, 'unit': 'kilogram',
+        'price': Decimal('12.50'), 'created_by': user, **fields,
+    })
+
+
+def create_conversation_messages(conversation, count):
+    """`count` unread messages from the conversation's second user to its first."""
+    for i in range(count):
+        message = Message.objects.create(
+            conversation=conversation, sender=conversation.user2, recipient=conversation.user1, content=f'unread {i}'
+        )
+        ConversationSummary.objects.record_message(message)
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+    return client
+
+
+def create_conversation(user, partner, messages=2):
+    """A conversation of `user` and `partner` with `messages` messages, alternating senders."""
+    conversation = Conversation.objects.create(user1=user, user2=partner)
+    ConversationSummary.objects.ensure_for(conversation)
+    for i in range(messages):
+        sender, recipient = (partner, user) if i % 2 == 0 else (user, partner)
+        message = Message.objects.create(
+            conversation=conversation, sender=sender, recipient=recipient, content=f'message {i}'
+        )
+        ConversationSummary.objects.record_message(message)
+    return conversation
+
+
+def enter_context(test, context):
+    """Enter a context manager (override_settings, mock.patch...) for the rest of `test`."""
+    value = context.__enter__()
+    test.addCleanup(context.__exit__, None, None, None)
+    return value
+
+
+def temporary_directory(test):
+    """A directory removed again after `test`."""
+    directory = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directory)
+    return directory
+
+
+def start_fake_completion_server(test, **options):
+    """A FakeCompletionServer on a free port for the duration of `test`, with the app pointed at it."""
+    server = FakeCompletionServer(('127.0.0.1', 0), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    enter_context(test, override_settings(OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY='test-key'))
+    return server
+
+
+class APITestMixin:
+    """`self.user` ('owner') and `self.client`, an APIClient signed in as them, for every test."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('owner')
+        self.client = client_for(self.user)
+
+    def bypass_catalogue_cache(self):
+        """Render public listings afresh, rather than from entries of earlier (rolled back) tests."""
+        enter_context(self, mock.patch.object(catalogue_cache, 'get', return_value=None))
+
+
+class APITestCase(APITestMixin, TestCase):
+    pass
+
+
+# The catalogue version (which the principal cache checks too) is only read in the warm-up request
+@override_settings(CATALOGUE_VERSION_RELOAD_INTERVAL=3600)
+class InboxQueryCountTests(APITestCase):
+    """The inbox is built with a constant number of queries, however many conversations it lists."""
+
+    def add_conversations(self, count):
+        for _ in range(count):
+            create_conversation(self.user, create_user(f'partner{User.objects.count()}'))
+
+    def get_inbox(self):
+        response = self.client.get(reverse('conversation-list'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_query_count_does_not_grow_with_the_inbox(self):
+        self.add_conversations(1)
+        self.get_inbox()  # Warm the per-process principal and token caches
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(self.get_inbox()), 1)
+        # Read now: every request resets connection.queries
+        expected = len(queries)
+
+        for total in (5, 25):
+            self.add_conversations(total - len(self.get_inbox()))
+            with self.assertNumQueries(expected):
+                inbox = self.get_inbox()
+            self.assertEqual(len(inbox), total)
+
+    def test_inbox_carries_latest_message_and_unread_count(self):
+        partner = create_user('partner')
+        create_conversation(self.user, partner, messages=3)
+        [row] = self.get_inbox()
+        self.assertEqual(row['latest_message_content'], 'message 2')
+        self.assertEqual(row['unread_messages_count'], 2)
+
+
+@skipUnless(connection.vendor in ('sqlite', 'mysql'), "Query plans are only checked on SQLite and MySQL")
+class QueryPlanTests(TestCase):
+    """The chat and order hot queries are answered from an index (see check_query_plans)."""
+
+    def test_hot_queries_use_an_index(self):
+        for name, queryset in hot_queries().items():
+            with self.subTest(name):
+                details, full_scan = explain(queryset)
+                self.assertFalse(full_scan, '\n'.join(details))
+
+
+class FastSerializerEquivalenceTests(TestCase):
+    """fast_serialize renders exactly what the DRF serializers render, field for field."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = create_user('seller')
+        seller.profile_picture = 'profile_pictures/seller.png'
+        seller.image_variants = {'thumb': {'webp': 'profile_pictures/variants/seller_thumb.webp'}}
+        seller.phone_number, seller.country, seller.last_active = '0123456789', 'NL', now()
+        seller.save()
+        buyer = create_user('buyer')
+
+        with_image = create_product(
+            seller, image='product_images/copper.jpg', description='Clean wire',
+            lat=Decimal('52.370216'), lng=Decimal('4.895168'), location='Amsterdam', product_status='listed',
+            image_variants={'thumb': {'webp': 'product_images/variants/copper_thumb.webp',
+                                      'jpeg': 'product_images/variants/copper_thumb.jpg'}},
+        )
+        bare = create_product(buyer, title='Paper bales', category='paper', unit='litre', price=Decimal('0.99'))
+        Order.objects.create(user=buyer, seller=seller, product=with_image, quantity=2,
+                             total_amount=Decimal('25.00'), tax=Decimal('2.10'))
+        Order.objects.create(user=seller, seller=buyer, product=bare, quantity=1,
+                             total_amount=Decimal('0.99'), status='delivered')
+
+        conversation = create_conversation(seller, buyer, messages=3)
+        Message.objects.filter(conversation=conversation).update(is_read=True, read_at=now() - timedelta(minutes=5))
+        Message.objects.create(conversation=conversation, sender=buyer, recipient=None, content=None)
+
+    def assertSameOutput(self, serializer_class, queryset, context):
+        instances = list(queryset)
+        self.assertTrue(instances)
+        renderer = JSONRenderer()
+        expected = renderer.render(serializer_class(instances, many=True, context=context).data)
+        actual = renderer.render(fast_serialize(serializer_class, instances, many=True, context=context))
+        self.assertEqual(actual, expected)
+        # A single instance takes the same path
+        self.assertEqual(
+            renderer.render(fast_serialize(serializer_class, instances[0], context=context)),
+            renderer.render(serializer_class(instances[0], context=context).data),
+        )
+
+    def test_same_output_as_drf(self):
+        request = RequestFactory().get('/api/products', SERVER_NAME='localhost')
+        cases = (
+            (ProductSerializer, Product.objects.select_related('created_by').order_by('id')),
+            (OrderSerializer, Order.objects.select_related('user', 'seller', 'product__created_by').order_by('id')),
+            (MessageSerializer, Message.objects.select_related(
+                'sender', 'recipient', 'conversation__user1', 'conversation__user2').order_by('id')),
+        )
+        # With a request, file fields render absolute URLs; without one, relative ones
+        for context in ({'request': request}, {}):
+            for serializer_class, queryset in cases:
+                with self.subTest(serializer_class.__name__, request='request' in context):
+                    self.assertSameOutput(serializer_class, queryset, context)
+
+
+@override_settings(CATALOGUE_VERSION_RELOAD_INTERVAL=3600)  # As InboxQueryCountTests
+class ListQueryCountTests(APITestCase):
+    """
+    Every list endpoint runs the same number of queries, at most MAX_QUERIES, however many
+    rows it returns; a per-row (N+1) query makes the count grow with the data.
+    """
+    MAX_QUERIES = 10
+
+    def setUp(self):
+        super().setUp()
+        # Rendered public listings would be served from the catalogue cache without a query
+        self.bypass_catalogue_cache()
+        self.conversation = None
+        self.add_rows(2)
+
+    def add_rows(self, count):
+        """`count` more partners, each with a conversation, products and orders both ways."""
+        for _ in range(count):
+            partner = create_user(f'partner{User.objects.count()}')
+            product = create_product(self.user, lat=Decimal('52.37'), lng=Decimal('4.89'), product_status='listed')
+            partner_product = create_product(partner, product_status='listed')
+            Order.objects.create(user=partner, seller=self.user, product=product, quantity=1, total_amount=Decimal('12.50'))
+            Order.objects.create(user=self.user, seller=partner, product=partner_product, quantity=1, total_amount=Decimal('12.50'))
+            conversation = create_conversation(self.user, partner)
+            self.conversation = self.conversation or conversation
+        # Unread messages in the measured conversation, for the endpoints that mark them read
+        create_conversation_messages(self.conversation, count * 2)
+
+    def endpoints(self):
+        """(method, url name, query params or body), one entry per list view and variant."""
+        partner_ids = list(User.objects.exclude(pk=self.user.pk).values_list('id', flat=True))
+        return [
+            # Before the message list, which marks the unread messages read too
+            ('post', 'latest_messages', {'conversation_id': self.conversation.id}),
+            ('get', 'conversations-message-list', {'conversation_id': self.conversation.id, 'record_per_page': 50}),
+            ('get', 'user_list', {}),
+            ('post', 'check-users-active', {'user_ids': partner_ids}),
+            ('get', 'product_list', {}),
+            ('get', 'product_list', {'page_size': 50}),
+            ('get', 'product_list_public', {}),
+            ('get', 'product_list_public', {'page_size': 50, 'fields': 'id,title,created_by.name'}),
+            ('get', 'product_list_public', {'lat': '52.37', 'lng': '4.89', 'radius': '10'}),
+            ('get', 'order_list', {'type': 'purchase'}),
+            ('get', 'order_list', {'type': 'sales', 'page_size': 50}),
+            ('get', 'order_list', {'type': 'sales', 'expand': ''}),
+            ('get', 'conversation-list', {}),
+            ('get', 'conversations-user-list', {}),
+        ]
+
+    def count_queries(self):
+        """Map each endpoint to its query count."""
+        self.client.get(reverse('user_list'))  # Warm the per-process principal and token caches
+        counts = {}
+        for method, name, params in self.endpoints():
+            kwargs = {'format': 'json'} if method == 'post' else {}
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(self.client, method)(reverse(name), params, **kwargs)
+            label = f"{method.upper()} {name} {sorted(params)}"
+            self.assertLess(response.status_code, 400, label)
+            counts[label] = len(queries)
+        return counts
+
+    def test_query_counts_are_constant_and_bounded(self):
+        small = self.count_queries()
+        self.add_rows(20)
+        large = self.count_queries()
+        for label, count in large.items():
+            with self.subTest(label):
+                self.assertEqual(count, small[label], "The query count grows with the number of rows")
+                self.assertLessEqual(count, self.MAX_QUERIES)
+
+
+class LatestMessagesWaitTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.partner = create_user('partner')
+        self.conversation = create_conversation(self.user, self.partner, messages=0)
+
+    def wait(self, client, **params):
+        return client.get(reverse('latest_messages_wait'), {'conversation_id': self.conversation.id, **params})
+
+    def test_rejects_timeouts_that_are_not_finite_and_positive(self):
+        for timeout in ('nan', 'inf', '-1', '0', 'soon'):
+            with self.subTest(timeout):
+                self.assertEqual(self.wait(self.client, timeout=timeout).status_code, 400)
+
+    def test_only_participants_may_wait_on_a_conversation(self):
+        create_conversation_messages(self.conversation, 1)
+        outsider = client_for(create_user('outsider'))
+        self.assertEqual(self.wait(outsider, timeout='0.01').status_code, 404)
+        # Nothing was taken from the participant
+        self.assertTrue(Message.objects.filter(conversation=self.conversation, is_read=False).exists())
+
+        response = self.wait(self.client, timeout='0.01')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([message['content'] for message in response.json()['data']], ['unread 0'])
+
+    def test_only_incoming_messages_of_the_conversation_wake_the_request(self):
+        message = Message.objects.create(
+            conversation=self.conversation, sender=self.partner, recipient=self.user, content='hi'
+        )
+        event = {'type': 'message', 'message': MessageSerializer(message).data}
+        self.assertTrue(is_incoming_message(event, self.conversation.id, self.user.id))
+        # The sender's own echo, another conversation, and non-message events
+        self.assertFalse(is_incoming_message(event, self.conversation.id, self.partner.id))
+        self.assertFalse(is_incoming_message(event, self.conversation.id + 1, self.user.id))
+        for other in ({'type': 'typing', 'conversation_id': self.conversation.id, 'user_id': self.partner.id},
+                      {'type': 'presence', 'user_id': self.partner.id, 'online': True},
+                      {'type': 'read', 'conversation_id': self.conversation.id, 'reader_id': self.partner.id}):
+            self.assertFalse(is_incoming_message(other, self.conversation.id, self.user.id))
+
+
+class ImageUploadTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        enter_context(self, override_settings(MEDIA_ROOT=temporary_directory(self)))
+        self.product = create_product(self.user)
+
+    def upload(self, content, name='upload.png'):
+        return self.client.put(reverse('product_image', args=[self.product.id]),
+                               {'image': SimpleUploadedFile(name, content)}, format='multipart')
+
+    def png(self, size=(64, 48)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'green').save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def test_multipart_image_is_stored_under_a_new_name(self):
+        response = self.upload(self.png(), name='holiday photo.jpg')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.product.refresh_from_db()
+        # Named after the detected type, not the client's file name
+        self.assertTrue(self.product.image.name.startswith('product_images/'))
+        self.assertTrue(self.product.image.name.endswith('.png'))
+        with self.product.image.open('rb') as stored:
+            self.assertEqual(stored.read(), self.png())
+
+    def test_oversize_and_non_image_uploads_are_rejected(self):
+        self.product.refresh_from_db()
+        original = self.product.image.name
+        with override_settings(IMAGE_UPLOAD_MAX_BYTES=1024):
+            response = self.upload(self.png(size=(600, 600)) + b'\0' * 2048)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('larger than', response.json()['data']['image'][0])
+
+        # Wrong magic bytes, and a file cut off within them
+        for content in (b'%PDF-1.4\n' + b'x' * 500, self.png()[:3]):
+            with self.subTest(content[:8]):
+                response = self.upload(content)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('valid image', response.json()['data']['image'][0])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image.name, original)
+
+    def test_json_body_is_unsupported_media_type(self):
+        for url, field in ((reverse('product_image', args=[self.product.id]), 'image'),
+                           (reverse('user_profile_picture', args=[self.user.id]), 'profile_picture')):
+            with self.subTest(url):
+                response = self.client.put(url, {field: 'data:image/png;base64,AAAA'}, format='json')
+                self.assertEqual(response.status_code, 415)
+
+
+class ImageVariantNameTests(SimpleTestCase):
+    """Variant names change with their content, since they are served as immutable."""
+
+    def setUp(self):
+        self.storage = FileSystemStorage(location=temporary_directory(self))
+        self.image = Image.new('RGB', (1200, 800), 'green')
+        self.name = 'product_images/0f8fad5b-d9cb-469f-a165-70867728950e.png'
+
+    def test_regenerated_variants_get_new_names_only_for_new_content(self):
+        first = set(variant_names(render_variants(self.image, self.storage, self.name)))
+        self.assertTrue(all(is_immutable(name) for name in first))
+        # Same sizes, same bytes: the existing files are reused
+        self.assertEqual(set(variant_names(render_variants(self.image, self.storage, self.name))), first)
+
+        with override_settings(IMAGE_VARIANT_SIZES={'thumb': 200, 'medium': 960}):
+            resized = set(variant_names(render_variants(self.image, self.storage, self.name)))
+        changed = resized - first
+        self.assertEqual(len(changed), 2)  # The thumbnail's WebP and JPEG
+        self.assertTrue(all('_thumb.' in name for name in changed))
+
+
+# Re-read the version on every call, so nothing read by an earlier (rolled back) test is kept
+@override_settings(CATALOGUE_VERSION_RELOAD_INTERVAL=0)
+class CatalogueVersionTests(APITestCase):
+    """The listing cache version lives in the database, so every worker sees a bump."""
+
+    def test_product_changes_bump_the_shared_version(self):
+        before = catalogue_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_product(self.user)
+        self.assertGreater(catalogue_version(), before)
+        self.assertEqual(CatalogueVersion.objects.get(pk=1).version, catalogue_version())
+
+    def test_bumps_by_other_workers_are_picked_up(self):
+        before = catalogue_version()
+        # As another process would
+        CatalogueVersion.objects.filter(pk=1).update(version=before + 5)
+        self.assertEqual(catalogue_version(), before + 5)
+
+    def test_cached_principals_are_dropped_on_user_changes_by_other_workers(self):
+        self.assertEqual(get_principal(self.user.id).name, 'owner')
+        User.objects.filter(id=self.user.id).update(name='Renamed', is_active=False)
+        self.assertEqual(get_principal(self.user.id).name, 'owner')  # Cached
+        # The version bump of the other worker's User save
+        CatalogueVersion.objects.filter(pk=1).update(version=catalogue_version() + 1)
+        principal = get_principal(self.user.id)
+        self.assertEqual((principal.name, principal.is_active), ('Renamed', False))
+
+
+class DescriptionRewriterTests(TestCase):
+    """Upstream calls of the rewriter, counted by the fake completion server."""
+
+    def rewriter(self, delay=0.2, max_concurrency=2, timeout=5):
+        self.server = start_fake_completion_server(self, delay=delay)
+        return DescriptionRewriter(max_concurrency=max_concurrency, timeout=timeout)
+
+    def test_cached_rewrites_are_not_sent_upstream(self):
+        rewriter = self.rewriter(delay=0)
+        content, cached = rewriter.rewrite('Scrap copper', 'metal')
+        self.assertFalse(cached)
+        # Case and whitespace don't make a title new
+        self.assertEqual(rewriter.rewrite(' scrap  COPPER', 'Metal'), (content, True))
+        self.assertEqual((self.server.requests, rewriter.upstream_calls), (1, 1))
+
+    def test_concurrent_identical_titles_share_one_call(self):
+        rewriter = self.rewriter()
+        key = cache_key('Scrap copper', 'metal', rewriter.model)
+        futures = [rewriter.submit(key, 'Scrap copper') for _ in range(5)]
+        self.assertEqual(len({future.result(timeout=5) for future in futures}), 1)
+        self.assertEqual((self.server.requests, rewriter.coalesced_calls), (1, 4))
+
+    def test_concurrent_calls_are_capped(self):
+        rewriter = self.rewriter(max_concurrency=2)
+        titles = [f'Scrap batch {i}' for i in range(6)]
+        futures = [rewriter.submit(cache_key(title, 'metal', rewriter.model), title) for title in titles]
+        for future in futures:
+            future.result(timeout=5)
+        self.assertEqual(self.server.requests, 6)
+        self.assertEqual(self.server.max_active, 2)
+
+    def test_slow_answers_are_abandoned_after_the_timeout(self):
+        rewriter = self.rewriter(delay=2, timeout=0.3)
+        started = time.monotonic()
+        with self.assertRaises(RewriteTimeout):
+            rewriter.rewrite('Scrap copper', 'metal')
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(rewriter.upstream_calls, 1)
+
+
+class RewriteDescriptionTests(APITestMixin, TransactionTestCase):
+    """With the default settings, a rewrite that misses the cache is run by the web process's own job workers."""
+
+    def setUp(self):
+        super().setUp()
+        self.server = start_fake_completion_server(self)
+        # A rewriter of its own, whose client is created against the fake server
+        enter_context(self, mock.patch('api.jobs.rewriter', DescriptionRewriter(max_concurrency=2, timeout=5)))
+
+    def rewrite(self, title):
+        return self.client.post(reverse('rewrite-description'), {'title': title, 'category': 'metal'}, format='json')
+
+    def test_rewrite_is_answered_by_the_default_workers(self):
+        self.assertGreater(settings.REWRITE_JOB_WORKERS, 0)
+        start_job_workers()  # As ApiConfig.ready does in web processes
+        self.addCleanup(job_workers.stop)
+
+        response = self.rewrite('Scrap copper')
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()['data']
+        self.assertIn('Scrap copper', data['improved_desc'])
+        self.assertFalse(data['cached'])
+
+        # The second time round it comes from the cache, without another upstream call
+        response = self.rewrite('  scrap COPPER ')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['data']['cached'])
+        self.assertEqual(self.server.requests, 1)
+
+
+# Re-read the catalogue version on every call, like CatalogueVersionTests
+@override_settings(CATALOGUE_VERSION_RELOAD_INTERVAL=0)
+class ConditionalListingTests(APITestCase):
+    """Public listings answer 304 to a current copy, and change with anything they embed."""
+
+    def setUp(self):
+        super().setUp()
+        # Its hits are validated the same way
+        self.bypass_catalogue_cache()
+        self.near = create_product(self.user, lat=Decimal('52.370000'), lng=Decimal('4.890000'))
+        self.far = create_product(self.user, lat=Decimal('51.920000'), lng=Decimal('4.480000'))
+
+    def get(self, params, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('product_list_public'), params, **headers)
+
+    def change(self, instance, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in fields.items():
+                setattr(instance, name, value)
+            instance.save()
+
+    def test_current_copy_is_not_modified(self):
+        for params in ({}, {'lat': '52.37', 'lng': '4.89', 'radius': '5'}):
+            with self.subTest(params):
+                etag = self.get(params)['ETag']
+                response = self.get(params, etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_creator_edits_change_the_etag(self):
+        etag = self.get({})['ETag']
+        self.change(self.user, name='Renamed seller')
+        response = self.get({}, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['data'][0]['created_by']['name'], 'Renamed seller')
+
+    def test_radius_etag_follows_the_products_returned(self):
+        params = {'lat': '52.37', 'lng': '4.89', 'radius': '5'}
+        response = self.get(params)
+        self.assertEqual([row['id'] for row in response.json()['data']], [self.near.id])
+        # Moved into the radius
+        self.change(self.far, lat=Decimal('52.371000'), lng=Decimal('4.891000'))
+        response = self.get(params, response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row['id'] for row in response.json()['data']}, {self.near.id, self.far.id})
+
+
+class TokenRefreshTests(APITestCase):
+    """An expired access token falls back to the refresh cookie, unless that was revoked."""
+
+    def setUp(self):
+        super().setUp()
+        # Cookies only, unless a test passes a header
+        self.client.credentials()
+        self.refresh = RefreshToken.for_user(self.user)
+        expired = AccessToken.for_user(self.user)
+        expired.set_exp(lifetime=-timedelta(minutes=1))
+        self.client.cookies['access'] = str(expired)
+
+    def get(self, **headers):
+        return self.client.get(reverse('user_list'), **headers)
+
+    def test_refresh_cookie_reissues_the_access_token(self):
+        self.client.cookies['refresh'] = str(self.refresh)
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        access = response['X-Access-Token']
+        self.assertEqual(response.cookies['access'].value, access)
+        self.assertEqual(AccessToken(access)['user_id'], self.user.id)
+
+        # The new token works on its own, and isn't reissued
+        del self.client.cookies['access'], self.client.cookies['refresh']
+        response = self.get(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Access-Token', response)
+
+    def test_without_a_refresh_cookie_the_request_is_unauthorized(self):
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_revoked_refresh_token_is_rejected(self):
+        self.client.cookies['refresh'] = str(self.refresh)
+        revoked_tokens.revoke(self.refresh)
+        response = self.get()
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn('X-Access-Token', response)
+
+    def test_revocations_by_other_workers_are_picked_up_even_when_committed_late(self):
+        revoked = RevokedTokenSet(reload_interval=0, reload_overlap=300)
+        self.assertFalse(revoked.is_revoked(self.refresh['jti']))
+        # Committed by another worker after that reload, but stamped before it
+        RevokedToken.objects.create(jti=self.refresh['jti'], expires_at=now() + timedelta(days=1))
+        RevokedToken.objects.filter(jti=self.refresh['jti']).update(created_at=now() - timedelta(minutes=1))
+        self.assertTrue(revoked.is_revoked(self.refresh['jti']))
+
+
+class PresenceStoreTests(TestCase):
+    """Heartbeats stay in memory until a batched flush; lookups take the newest timestamp."""
+
+    def setUp(self):
+        # Flushed by hand (and by stop) only
+        self.store = PresenceStore(max_users=100, ttl=300, flush_interval=3600)
+        self.addCleanup(self.store.stop)
+        self.users = [create_user(f'user{i}') for i in range(3)]
+
+    def test_heartbeats_are_flushed_in_one_batched_update(self):
+        with self.assertNumQueries(0):
+            seen = {user.id: self.store.touch(user.id) for user in self.users[:2]}
+        self.assertFalse(User.objects.filter(last_active__isnull=False).exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.store.flush(), 2)
+        self.assertEqual(
+            dict(User.objects.filter(is_active_user=True).values_list('id', 'last_active')), seen
+        )
+        # Nothing new to write
+        with self.assertNumQueries(0):
+            self.assertEqual(self.store.flush(), 0)
+
+    def test_last_seen_many_is_one_query_for_the_newest_timestamps(self):
+        in_memory, in_database, never = self.users
+        memory_seen = self.store.touch(in_memory.id)
+        User.objects.filter(id=in_memory.id).update(last_active=memory_seen - timedelta(hours=1))
+        # Heartbeats sent to another worker since
+        self.store.touch(in_database.id)
+        database_seen = now() + timedelta(seconds=5)
+        User.objects.filter(id=in_database.id).update(last_active=database_seen)
+
+        ids = [user.id for user in self.users] + [0]
+        with self.assertNumQueries(1):
+            last_seen = self.store.last_seen_many(ids)
+        self.assertEqual(last_seen, {in_memory.id: memory_seen, in_database.id: database_seen, never.id: None})
+        self.assertEqual(self.store.peek(in_database.id, database_seen), database_seen)
+        self.assertEqual(
+            self.store.is_active_many(ids), {in_memory.id: True, in_database.id: True, never.id: False}
+        )
+
+
+@skipUnless(connection.vendor == 'sqlite', "Checks the SQLite FTS5 search backend")
+class ProductSearchTests(APITestCase):
+    """Ranked product search: FTS5 with bm25 on SQLite, icontains elsewhere."""
+
+    def setUp(self):
+        super().setUp()
+        self.bypass_catalogue_cache()
+        self.in_title = create_product(self.user, title='Copper wire offcuts', lat=Decimal('52.37'), lng=Decimal('4.89'))
+        self.in_description = create_product(self.user, title='Plumbing leftovers', description='Old copper pipes',
+                                             lat=Decimal('52.37'), lng=Decimal('4.89'))
+        create_product(self.user, title='Plastic bottles', description='Clear PET')
+
+    def search(self, query, using_backend=None):
+        return list(fulltext.search(Product.objects.all(), query, using_backend).values_list('id', flat=True))
+
+    def test_fts5_ranks_title_matches_first(self):
+        self.assertEqual(fulltext.backend(connection), 'fts5')
+        expected = [self.in_title.id, self.in_description.id]
+        # Whole words and prefixes, whatever the case
+        for query in ('copper', 'COPP', 'cop'):
+            with self.subTest(query):
+                self.assertEqual(self.search(query), expected)
+        self.assertEqual(self.search('copper pipes'), [self.in_description.id])
+        self.assertEqual(self.search('aluminium'), [])
+
+        # Rows edited after the insert are matched on their new text (the triggers)
+        self.in_title.title = 'Brass fittings'
+        self.in_title.save()
+        self.assertEqual(self.search('copper'), [self.in_description.id])
+
+    def test_icontains_fallback_matches_the_same_rows(self):
+        for query in ('copper', 'COPP', 'copper pipes', 'aluminium'):
+            with self.subTest(query):
+                self.assertEqual(self.search(query, 'icontains'), self.search(query))
+
+    def test_listing_search_with_conditional_get_and_eager_loading(self):
+        url = reverse('product_list_public')
+        for params in ({'query': 'copper'},
+                       {'query': 'copper', 'fields': 'id,title,created_by.name'},
+                       {'query': 'copper', 'lat': '52.37', 'lng': '4.89', 'radius': '5'}):
+            with self.subTest(params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual({row['id'] for row in response.json()['data']},
+                                 {self.in_title.id, self.in_description.id})
+                response = self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, {'query': 'copper'})
+        self.assertEqual([row['id'] for row in response.json()['data']], [self.in_title.id, self.in_description.id])
+
+
+class RadiusListingTests(APITestCase):
+    """Radius listings search around the caller's exact position, cached or not."""
+
+    def test_nearby_callers_get_their_own_results(self):
+        product = create_product(self.user, lat=Decimal('52.370000'), lng=Decimal('4.890000'))
+        url = reverse('product_list_public')
+        # About 0.52 km from the product, in the same 0.01-degree cell
+        for (lat, lng), expected in ((('52.370000', '4.890000'), [product.id]), (('52.374000', '4.894000'), [])):
+            with self.subTest(lat=lat, lng=lng):
+                response = self.client.get(url, {'lat': lat, 'lng': lng, 'radius': '0.5'})
+                self.assertEqual([row['id'] for row in response.json()['data']], expected)
+                self.assertEqual(response['X-Cache'], 'MISS')
@@ -0,0 +1,107 @@
+import uuid
+
+import filetype
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.http import QueryDict
+from django.template.defaultfilters import filesizeformat
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework.fields import ImageField
+
+# filetype reads at most this many bytes of a file to recognize it
+HEADER_BYTES = 261
+
+# filetype extensions accepted as images, as in Base64ImageField.ALLOWED_TYPES
+IMAGE_EXTENSIONS = ('jpg', 'png', 'gif', 'webp')
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams the multipart files of `field_names` to a temporary file, chunk by chunk,
+    so an upload never has to fit in memory.
+
+    The type is recognized by `filetype` from the first bytes only. Files that aren't
+    an accepted image or grow past IMAGE_UPLOAD_MAX_BYTES are dropped as soon as that
+    is known, and the reason is kept in `errors` (field name -> messages, like
+    serializer errors). Accepted files get a random name with the detected extension,
+    like the base64 path gives them. Files of other fields are ignored.
+    """
+
+    def __init__(self, request=None, field_names=(), max_size=None):
+        super().__init__(request)
+        self.field_names = set(field_names)
+        self.max_size = max_size or getattr(settings, 'IMAGE_UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+        self.errors = {}
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.header = b''
+        self.kind = None
+        if field_name not in self.field_names:
+            raise SkipFile()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            self.reject(f"The image is larger than {filesizeformat(self.max_size)}.")
+        if self.kind is None and len(self.header) < HEADER_BYTES:
+            self.header += raw_data[:HEADER_BYTES - len(self.header)]
+            if len(self.header) == HEADER_BYTES:
+                self.check_type()
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.kind is None:
+            try:
+                self.check_type()  # Smaller than HEADER_BYTES
+            except SkipFile:
+                self.file.close()
+                return None
+        file = super().file_complete(file_size)
+        file.name = f"{uuid.uuid4()}.{self.kind.extension}"
+        file.content_type = self.kind.mime
+        file.validated_image_type = self.kind.extension
+        return file
+
+    def check_type(self):
+        kind = filetype.guess(self.header)
+        if kind is None or kind.extension not in IMAGE_EXTENSIONS:
+            self.reject("Upload a valid image (JPEG, PNG, GIF or WebP).")
+        self.kind = kind
+
+    def reject(self, message):
+        self.errors.setdefault(self.field_name, []).append(message)
+        raise SkipFile()
+
+
+def accept_image_uploads(request, field_names):
+    """
+    Have multipart requests stream the files of `field_names` through an
+    ImageUploadHandler. Call it before reading `request.data`; returns the handler,
+    whose `errors` are filled in once the data is read.
+    """
+    handler = ImageUploadHandler(request, field_names)
+    request.upload_handlers = [handler]
+    return handler
+
+
+def request_data(request):
+    """`request.data` as a mutable dict, for JSON and multipart requests alike."""
+    if isinstance(request.data, QueryDict):
+        return request.data.dict()
+    return request.data
+
+
+class ImageUploadField(Base64ImageField):
+    """
+    A Base64ImageField that also takes multipart file uploads. Files already checked by
+    ImageUploadHandler are taken as they are; other uploaded files get the usual
+    Pillow validation.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            if getattr(data, 'validated_image_type', None):
+                return data
+            return ImageField.to_internal_value(self, data)
+        return super().to_internal_value(data)
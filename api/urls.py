@@ -2,13 +2,13 @@ from django.conf import settings
 from django.urls import path
 
 from rest_framework.urlpatterns import format_suffix_patterns
-from django.conf.urls.static import static
+from api.media import serve
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from api.views.users import UserAPIView
-from api.views.products import ProductAPIView,ProductWithoutAuthAPIView,ReWriteDescriptionAPIView
-from api.views.conversations  import ConversationAPIView, ConversationDetailAPIView,LatestMessagesAPIView, MessageAPIView, UserListAPIView
+from api.views.users import UserAPIView, UserProfilePictureAPIView
+from api.views.products import ProductAPIView,ProductImageAPIView,ProductWithoutAuthAPIView,ReWriteDescriptionAPIView,RewriteJobAPIView,CatalogueCacheStatsAPIView
+from api.views.conversations  import ConversationAPIView, ConversationDetailAPIView,LatestMessagesAPIView, LatestMessagesWaitAPIView, MessageAPIView, UserListAPIView
 from api.views.orders import OrderAPIView
-from api.views.users import CheckUserActiveStatusAPIView, UpdateUserLastActiveAPIView
+from api.views.users import CheckUserActiveStatusAPIView, CheckUsersActiveStatusAPIView, UpdateUserLastActiveAPIView
 
 from api.views.authentication import (
     UserLogoutView,UserRegistrationView,
@@ -19,8 +19,10 @@ urlpatterns = [
     # User CRUD
     path('users', UserAPIView.as_view(), name='user_list'),
     path('users/<int:user_id>', UserAPIView.as_view(), name='user_detail'),
+    path('users/<int:user_id>/profile-picture', UserProfilePictureAPIView.as_view(), name='user_profile_picture'),
 
     path('users/check-user-active', CheckUserActiveStatusAPIView.as_view(), name='check-user-active'),
+    path('users/check-users-active', CheckUsersActiveStatusAPIView.as_view(), name='check-users-active'),
     path('users/update-active', UpdateUserLastActiveAPIView.as_view(), name='update-user-active'),
 
     # Authentication apis
@@ -35,9 +37,12 @@ urlpatterns = [
     # PRODUCT
     path('products', ProductAPIView.as_view(), name='product_list'),
     path('products/<int:product_id>', ProductAPIView.as_view(), name='product_detail'),
+    path('products/<int:product_id>/image', ProductImageAPIView.as_view(), name='product_image'),
     path('products/public', ProductWithoutAuthAPIView.as_view(), name='product_list_public'),
     path('products/public/<int:product_id>', ProductWithoutAuthAPIView.as_view(), name='product_detail_public'),
+    path('products/public/cache-stats', CatalogueCacheStatsAPIView.as_view(), name='product_public_cache_stats'),
     path('products/chat-gpt-re-write-dec', ReWriteDescriptionAPIView.as_view(), name='rewrite-description'),
+    path('products/chat-gpt-re-write-dec/jobs/<uuid:job_id>', RewriteJobAPIView.as_view(), name='rewrite-description-job'),
 
     # PRODUCT
     path('orders', OrderAPIView.as_view(), name='order_list'),
@@ -46,6 +51,7 @@ urlpatterns = [
     path('conversations', ConversationAPIView.as_view(), name='conversation-list'),
     path('conversations/<int:pk>', ConversationDetailAPIView.as_view(), name='conversation-detail'),
     path('conversations/latest_messages', LatestMessagesAPIView.as_view(), name='latest_messages'),
+    path('conversations/latest_messages/wait', LatestMessagesWaitAPIView.as_view(), name='latest_messages_wait'),
     path('conversations/messages', MessageAPIView.as_view(), name='conversations-message-list'),
     path('conversations/users', UserListAPIView.as_view(), name='conversations-user-list'),
 
@@ -56,7 +62,8 @@ urlpatterns = [
   
 ]
 
-# Serve media files in development
-# if settings.DEBUG:
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Media is also reachable under /api/media/ (served like /media/, see api.media.serve)
+urlpatterns += [
+    path(settings.MEDIA_URL.lstrip('/') + '<path:path>', serve, {'document_root': settings.MEDIA_ROOT, 'url_prefix': settings.MEDIA_URL.lstrip('/')}),
+]
 urlpatterns = format_suffix_patterns(urlpatterns)
@@ -16,8 +16,8 @@ from ..serializers import (
 from _applibs.response import echo, Messages
 from ..decorators import token_auth_required,token_auth_not_required
 from api.functions import generateToken
+from api.revocation import revoked_tokens
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.exceptions import NotFound
 import uuid
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
@@ -81,16 +81,11 @@ class UserView(APIView):
     @token_auth_required
     def get(self, request):
         try:
-            # Fetch the currently authenticated user
+            # The currently authenticated user, already resolved by token_auth_required
             user = request.user
 
-            # Fetch additional user details, if needed
-            user_details = User.objects.get_user(user.id)
-            if not user_details:
-                raise NotFound("User details not found.")
-
             # Serialize the user details
-            serializer = UserSerializer(user_details)
+            serializer = UserSerializer(user)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -113,11 +108,11 @@ class UserLogoutView(APIView):
                 # Create RefreshToken object from the provided token
                 refresh = RefreshToken(refresh_token)
                 
-                # Blacklist the refresh token
-                refresh.blacklist()
+                # Revoke the refresh token (persisted and added to the in-memory revoked set)
+                revoked_tokens.revoke(refresh)
                 
                 # Optionally, log the action or notify the user
-                logger.info(f"Token for user {refresh.user_id} has been invalidated.")
+                logger.info(f"Token for user {refresh.get('user_id')} has been invalidated.")
                 
             except Exception as e:
                 # Handle the exception if token invalidation fails
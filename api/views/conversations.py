@@ -1,15 +1,22 @@
 from rest_framework.views import APIView
+from django.views import View
+from django.conf import settings
+from asgiref.sync import sync_to_async
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from orm.models import Conversation, Message, User
+from orm.models import Conversation, ConversationSummary, Message, User
 from ..serializers import ConversationSerializer, MessageSerializer, UserSerializer,GetUserConversationsSerializer
-from _applibs.response import echo, Messages
-from ..decorators import token_auth_required
-from django.db import models
+from _applibs.response import echo, echo_json, Messages
+from ..decorators import token_auth_required, async_token_auth_required
+from ..notifications import get_broker, user_channel
+from django.db import models, transaction
 from django.utils.timezone import now
 from ..functions import CustomPagination
+from ..fast_serializers import Fieldset, fast_serialize, setup_eager_loading
 import logging,json
+import math
+import time
 logger = logging.getLogger(__name__)
 
 
@@ -17,12 +24,24 @@ class ConversationAPIView(APIView):
     @token_auth_required
     def get(self, request):
         session_user = request.user
-        conversations = Conversation.objects.filter(
-            models.Q(user1=session_user) | models.Q(user2=session_user)
-        ).order_by('-latest_conversation')
 
-        serializer = GetUserConversationsSerializer(conversations, many=True, context={'request': request})
-        return echo(status=status.HTTP_200_OK, msg=Messages.SUCCESS, data=serializer.data)
+        # One indexed scan of the user's summary rows, with the conversation and both users joined in
+        summaries = ConversationSummary.objects.filter(user=session_user).select_related(
+            'conversation__user1', 'conversation__user2'
+        ).order_by('-last_message_at', '-conversation_id')
+
+        conversations = []
+        for summary in summaries:
+            conversation = summary.conversation
+            conversation.latest_message_text = summary.last_message_content
+            conversation.unread_count = summary.unread_count
+            conversations.append(conversation)
+
+        data = fast_serialize(
+            GetUserConversationsSerializer, conversations, many=True, context={'request': request},
+            fieldset=Fieldset.from_request(request)
+        )
+        return echo(status=status.HTTP_200_OK, msg=Messages.SUCCESS, data=data)
 
    
     @token_auth_required
@@ -47,10 +66,12 @@ class ConversationAPIView(APIView):
             return echo(status=status.HTTP_200_OK, msg="Conversation already exists", data=serializer.data)
 
         # Create a new conversation
-        conversation = Conversation.objects.create(
-            user1_id=request.user.id,
-            user2_id=user_id
-        )
+        with transaction.atomic():
+            conversation = Conversation.objects.create(
+                user1_id=request.user.id,
+                user2_id=user_id
+            )
+            ConversationSummary.objects.ensure_for(conversation)
 
         serializer = ConversationSerializer(conversation)
         return echo(status=status.HTTP_201_CREATED, msg=Messages.CREATED, data=serializer.data)
@@ -61,10 +82,86 @@ class ConversationDetailAPIView(APIView):
     @token_auth_required
     def get(self, request, pk):
         """Retrieve a specific conversation and mark messages as read."""
-        conversation = get_object_or_404(Conversation, pk=pk)
+        conversation = get_object_or_404(Conversation.objects.inbox_for(request.user), pk=pk)
         serializer = GetUserConversationsSerializer(conversation,context={'request': request})
         return echo(status=status.HTTP_200_OK, msg=Messages.SUCCESS, data=serializer.data)
 
+def publish_event(user_ids, event):
+    """Publish a chat event to the given users once the current transaction commits."""
+    broker = get_broker()
+    for user_id in set(user_ids) - {None}:
+        transaction.on_commit(lambda user_id=user_id: broker.publish(user_channel(user_id), event))
+
+
+def create_message(sender, data):
+    """
+    Persist a message sent by `sender` and notify both participants.
+    Shared by MessageAPIView.post and the WebSocket transport; returns (data, errors).
+    """
+    serializer = MessageSerializer(data=data)
+    if not serializer.is_valid():
+        return None, serializer.errors
+
+    with transaction.atomic():
+        # Save the message
+        message = serializer.save(sender=sender)
+
+        # Update the latest_conversation field in the associated Conversation
+        conversation = message.conversation
+        conversation.latest_conversation = now()
+        conversation.save()
+
+        # Keep both participants' inbox rows in step
+        ConversationSummary.objects.record_message(message)
+
+        # Wake the participants' long-poll requests and sockets once the message is visible
+        publish_event([message.sender_id, message.recipient_id], {'type': 'message', 'message': serializer.data})
+
+    return serializer.data, None
+
+
+def mark_conversation_read(conversation, reader, message_ids=None):
+    """Mark the reader's unread messages (or just `message_ids`) as read and send a read receipt."""
+    messages = Message.objects.filter(conversation=conversation, recipient_id=reader.id, is_read=False)
+    if message_ids is not None:
+        messages = messages.filter(id__in=message_ids)
+
+    with transaction.atomic():
+        if messages.update(is_read=True):
+            ConversationSummary.objects.mark_read(conversation.id, reader.id)
+            other_user_id = conversation.user2_id if conversation.user1_id == reader.id else conversation.user1_id
+            publish_event([other_user_id], {'type': 'read', 'conversation_id': conversation.id, 'reader_id': reader.id})
+
+
+def take_unread_messages(conversation, user, context=None):
+    """Serialize the conversation's unread messages for `user` and mark them as read."""
+    # Filter messages where recipient_id is not the logged-in user and mark as read
+    messages = Message.objects.filter(
+        conversation=conversation,
+        is_read=False,
+        recipient=user.id
+    )
+
+    # Serialize the messages and conversation
+    messages = setup_eager_loading(messages, MessageSerializer)
+    data = fast_serialize(MessageSerializer, messages, many=True, context=context)
+    # Update the unread messages as read, only the rows that were returned so messages
+    # arriving meanwhile stay unread
+    if data:
+        mark_conversation_read(conversation, user, [message['id'] for message in data])
+    return data
+
+
+def is_incoming_message(event, conversation_id, user_id):
+    """Whether a chat broker event is a message sent to `user_id` in the given conversation."""
+    message = event.get('message') if event.get('type') == 'message' else None
+    if not isinstance(message, dict):
+        return False
+    conversation = message.get('conversation') or {}
+    recipient = message.get('recipient') or {}
+    return conversation.get('id') == conversation_id and recipient.get('id') == user_id
+
+
 class LatestMessagesAPIView(APIView):
     @token_auth_required
     def post(self, request):
@@ -75,18 +172,7 @@ class LatestMessagesAPIView(APIView):
         # Retrieve the conversation by its ID
         conversation = get_object_or_404(Conversation, pk=pk)
 
-        # Filter messages where recipient_id is not the logged-in user and mark as read
-        messages = Message.objects.filter(
-            conversation=conversation,
-            is_read=False,
-            recipient=request.user.id
-        )
- 
-        # Serialize the messages and conversation
-        message_serializer = MessageSerializer(messages, many=True, context={'request': request})
-        data = message_serializer.data
-        # Update the unread messages as read
-        messages.update(is_read=True)
+        data = take_unread_messages(conversation, request.user, context={'request': request})
 
         return echo(
             status=status.HTTP_200_OK,
@@ -95,6 +181,54 @@ class LatestMessagesAPIView(APIView):
         )
 
 
+class LatestMessagesWaitAPIView(View):
+    """
+    Long-poll variant of LatestMessagesAPIView, served natively by the ASGI application.
+
+    The request is parked on the chat broker until an event for the session user
+    arrives or the timeout passes, so an idle chat costs one query per poll window
+    instead of one query and one UPDATE every few seconds.
+    """
+
+    @async_token_auth_required
+    async def get(self, request):
+        pk = request.GET.get('conversation_id')
+        if not pk:
+            return echo_json(status=status.HTTP_400_BAD_REQUEST, msg="Conversation ID is required.")
+
+        try:
+            timeout = float(request.GET.get('timeout', settings.LONG_POLL_TIMEOUT))
+        except ValueError:
+            timeout = math.nan
+        # nan would slip through min() and never reach the deadline
+        if not math.isfinite(timeout) or timeout <= 0:
+            return echo_json(status=status.HTTP_400_BAD_REQUEST, msg=Messages.INVALID_PARAMETERS)
+        timeout = min(timeout, settings.LONG_POLL_TIMEOUT)
+
+        # Only the participants may wait on a conversation; others get the 404 of a missing one
+        user_id = request.user.id
+        conversation = await Conversation.objects.filter(
+            models.Q(user1_id=user_id) | models.Q(user2_id=user_id), pk=pk
+        ).afirst()
+        if not conversation:
+            return echo_json(status=status.HTTP_404_NOT_FOUND, msg=Messages.NF)
+
+        deadline = time.monotonic() + timeout
+        # Subscribe before checking, so a message sent in between still wakes this request
+        with get_broker().subscribe(user_channel(request.user.id)) as subscription:
+            data = await sync_to_async(take_unread_messages)(conversation, request.user, {'request': request})
+            while not data:
+                remaining = deadline - time.monotonic()
+                event = await subscription.get(remaining) if remaining > 0 else None
+                if event is None:
+                    break
+                # Typing, presence, read receipts and other conversations don't need a query
+                if is_incoming_message(event, conversation.id, request.user.id):
+                    data = await sync_to_async(take_unread_messages)(conversation, request.user, {'request': request})
+
+        return echo_json(status=status.HTTP_200_OK, msg=Messages.SUCCESS, data=data)
+
+
 class UserListAPIView(APIView):
     @token_auth_required
     def get(self, request):
@@ -148,21 +282,19 @@ class MessageAPIView(APIView):
             self.pagination['total_records'] = Message.objects.filter(conversation_id=conversation_id).count()
             self.pagination['total_pages'] = (self.pagination['total_records'] + self.pagination['record_per_page'] - 1) // self.pagination['record_per_page']
 
-            # Fetch paginated messages
-            messages = Message.objects.filter(conversation_id=conversation_id).order_by('-created_at')[
-                self.pagination['record_from']:self.pagination['record_to']
-            ]
+            # Fetch paginated messages with their nested objects, narrowed by an optional ?fields= / ?expand=
+            messages = Message.objects.filter(conversation_id=conversation_id).order_by('-created_at')
+            fieldset = Fieldset.from_request(request)
+            messages = setup_eager_loading(messages, MessageSerializer, fieldset)
+            messages = messages[self.pagination['record_from']:self.pagination['record_to']]
 
             # Mark unread messages (sent by the other user) as read
-            unread_messages = Message.objects.filter(
-                conversation_id=conversation_id,
-                recipient_id=request.user.id,
-                is_read=False
-            )
-            unread_messages.update(is_read=True)
+            conversation = Conversation.objects.filter(pk=conversation_id).first()
+            if conversation:
+                mark_conversation_read(conversation, request.user)
 
             # Serialize the messages
-            serializer = MessageSerializer(messages, many=True, context={'request': request})
+            data = fast_serialize(MessageSerializer, messages, many=True, context={'request': request}, fieldset=fieldset)
 
             # Return the response with pagination details
             return echo(
@@ -170,7 +302,7 @@ class MessageAPIView(APIView):
                 msg=Messages.SUCCESS,
                 data={
                     "pagination": self.pagination,
-                    "messages": serializer.data
+                    "messages": data
                 }
             )
 
@@ -182,20 +314,9 @@ class MessageAPIView(APIView):
     @token_auth_required
     def post(self, request):
         """Send a message in a conversation."""
-        serializer = MessageSerializer(data=request.data)
-        if serializer.is_valid():
-            # Save the message
-            message = serializer.save(sender=request.user)
-
-            # Update the latest_conversation field in the associated Conversation
-            conversation = message.conversation
-            conversation.latest_conversation = now()
-            conversation.save()
-
+        data, errors = create_message(request.user, request.data)
+        if errors is None:
             # Return the response
-            return echo(status=status.HTTP_201_CREATED, msg=Messages.CREATED, data=serializer.data)
-
-        return echo(status=status.HTTP_400_BAD_REQUEST, msg=Messages.INVALID_PARAMETERS, data=serializer.errors)
-
-
+            return echo(status=status.HTTP_201_CREATED, msg=Messages.CREATED, data=data)
 
+        return echo(status=status.HTTP_400_BAD_REQUEST, msg=Messages.INVALID_PARAMETERS, data=errors)
@@ -9,6 +9,10 @@ from _applibs.response import echo, Messages
 from api.serializers import OrderSerializer,UserSerializer
 from orm.models import Order,User
 from ..decorators import token_auth_required
+from ..functions import KeysetPagination
+from ..conditional import ListingValidators
+from ..catalogue import catalogue_version
+from ..fast_serializers import Fieldset, fast_serialize, setup_eager_loading
 from django.db import transaction
 
 
@@ -41,9 +45,32 @@ class OrderAPIView(APIView):
             else:
                 return echo(status=status.HTTP_400_BAD_REQUEST, msg="Invalid type parameter. Use 'purchase' or 'sales'.")
 
+            # Join in the nested objects, narrowed by an optional ?fields= / ?expand=
+            fieldset = Fieldset.from_request(request)
+            orders = setup_eager_loading(orders, OrderSerializer, fieldset)
+
+            # 304 without serializing when the client's copy is current; orders embed their product and users
+            validators = ListingValidators.for_queryset(
+                request, orders, ('updated_at', 'product__updated_at'), version=catalogue_version()
+            )
+            not_modified = validators.not_modified(request)
+            if not_modified:
+                return not_modified
+
+            paginator = KeysetPagination()
+            if paginator.is_requested(request):
+                try:
+                    page = paginator.paginate_queryset(orders, request)
+                except ValueError as e:
+                    return echo(status=status.HTTP_400_BAD_REQUEST, msg=str(e))
+                data = fast_serialize(OrderSerializer, page, many=True, context={'request': request}, fieldset=fieldset)
+                return validators.apply(
+                    echo(status=status.HTTP_200_OK, msg="Success", data=paginator.get_paginated_data(data))
+                )
+
             # Serialize and return the orders
-            serializer = OrderSerializer(orders, many=True, context={'request': request})
-            return echo(status=status.HTTP_200_OK, msg="Success", data=serializer.data)
+            data = fast_serialize(OrderSerializer, orders, many=True, context={'request': request}, fieldset=fieldset)
+            return validators.apply(echo(status=status.HTTP_200_OK, msg="Success", data=data))
 
         except Exception as e:
             logger.exception(e)
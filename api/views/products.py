@@ -4,15 +4,27 @@ import json
 from django.http import Http404
 from rest_framework import status
 from rest_framework.views import APIView
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.urls import reverse
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import ParseError, UnsupportedMediaType
+from rest_framework.parsers import MultiPartParser
 from django.shortcuts import get_object_or_404
-from _applibs.response import echo, Messages
+from _applibs.response import echo, echo_json, Messages
 from api.serializers import ProductSerializer,UserSerializer
 from orm.models import Product,User
-from ..decorators import token_auth_required
+from ..decorators import token_auth_required, async_token_auth_required
+from ..geo import filter_by_radius, haversine
+from ..functions import KeysetPagination
+from ..conditional import ListingValidators
+from ..catalogue import cache_catalogue_listing, catalogue_cache, catalogue_version
+from ..fast_serializers import Fieldset, fast_serialize, setup_eager_loading
+from ..uploads import accept_image_uploads, request_data
+from ..rewrite import build_prompt, rewriter
+from ..jobs import get_job_backend, serialize_job, submit_job, wait_for_job
 from django.db import transaction
 from django.conf import settings
-import openai
-openai.api_key = settings.OPENAI_API_KEY
 
 logger = logging.getLogger(__name__)
 
@@ -35,8 +47,30 @@ class ProductAPIView(APIView):
             else:
                 # Fetch all products for the authenticated user
                 products = Product.objects.filter(created_by=created_by_id).order_by('-created_at')
-                serializer = ProductSerializer(products, many=True, context={'request': request})
-                return echo(status=status.HTTP_200_OK, msg="Success", data=serializer.data)
+
+                # Join in the nested objects, narrowed by an optional ?fields= / ?expand=
+                fieldset = Fieldset.from_request(request)
+                products = setup_eager_loading(products, ProductSerializer, fieldset)
+
+                # 304 without serializing when the client's copy of the listing is current
+                validators = ListingValidators.for_queryset(request, products, version=catalogue_version())
+                not_modified = validators.not_modified(request)
+                if not_modified:
+                    return not_modified
+
+                paginator = KeysetPagination()
+                if paginator.is_requested(request):
+                    try:
+                        page = paginator.paginate_queryset(products, request)
+                    except ValueError as e:
+                        return echo(status=status.HTTP_400_BAD_REQUEST, msg=str(e))
+                    data = fast_serialize(ProductSerializer, page, many=True, context={'request': request}, fieldset=fieldset)
+                    return validators.apply(
+                        echo(status=status.HTTP_200_OK, msg="Success", data=paginator.get_paginated_data(data))
+                    )
+
+                data = fast_serialize(ProductSerializer, products, many=True, context={'request': request}, fieldset=fieldset)
+                return validators.apply(echo(status=status.HTTP_200_OK, msg="Success", data=data))
             
         except Exception as e:
             logger.exception(e)
@@ -45,17 +79,23 @@ class ProductAPIView(APIView):
     @token_auth_required
     def post(self, request):
         try:
+            # The image comes base64-encoded in JSON, or as a streamed multipart file
+            uploads = accept_image_uploads(request, ['image'])
+            data = request_data(request)
+            if uploads.errors:
+                return echo(status=status.HTTP_400_BAD_REQUEST, msg="Validation failed.", data=uploads.errors)
+
             # Add the current user's ID to the request data
-            request.data['created_by_id'] = request.user.id
+            data['created_by_id'] = request.user.id
             
             # Truncate latitude and longitude to 6 decimal places
-            if 'lat' in request.data:
-                request.data['lat'] = round(float(request.data['lat']), 6)
-            if 'lng' in request.data:
-                request.data['lng'] = round(float(request.data['lng']), 6)
+            if 'lat' in data:
+                data['lat'] = round(float(data['lat']), 6)
+            if 'lng' in data:
+                data['lng'] = round(float(data['lng']), 6)
 
             # Initialize serializer with updated data
-            serializer = ProductSerializer(data=request.data, context={'request': request})
+            serializer = ProductSerializer(data=data, context={'request': request})
 
             # Validate the data
             if serializer.is_valid():
@@ -96,14 +136,19 @@ class ProductAPIView(APIView):
 
             logger.info(f"Received PUT request for order_id: {product_id}, user_id: {request.user.id}")
 
+            uploads = accept_image_uploads(request, ['image'])
+            data = request_data(request)
+            if uploads.errors:
+                return echo(status=status.HTTP_400_BAD_REQUEST, msg="Validation failed.", data=uploads.errors)
+
             # Truncate latitude and longitude to 6 decimal places
-            if 'lat' in request.data:
-                request.data['lat'] = round(float(request.data['lat']), 6)
-            if 'lng' in request.data:
-                request.data['lng'] = round(float(request.data['lng']), 6)
+            if 'lat' in data:
+                data['lat'] = round(float(data['lat']), 6)
+            if 'lng' in data:
+                data['lng'] = round(float(data['lng']), 6)
 
             # Update the product with the new data
-            serializer = ProductSerializer(product, data=request.data, partial=True, context={'request': request})
+            serializer = ProductSerializer(product, data=data, partial=True, context={'request': request})
             if serializer.is_valid():
                 updated_product = serializer.save()
                 return echo(
@@ -153,10 +198,44 @@ class ProductAPIView(APIView):
                 data=str(e)
             )
         
+class ProductImageAPIView(APIView):
+    """Replace a product's image with a multipart upload, streamed to disk."""
+    permission_classes, authentication_classes = [], []
+    parser_classes = [MultiPartParser]
+
+    @token_auth_required
+    def put(self, request, product_id):
+        try:
+            product = get_object_or_404(Product, id=product_id, created_by_id=request.user.id)
+
+            uploads = accept_image_uploads(request, ['image'])
+            image = request.data.get('image')
+            if uploads.errors:
+                return echo(status=status.HTTP_400_BAD_REQUEST, msg="Validation failed.", data=uploads.errors)
+            if image is None:
+                return echo(status=status.HTTP_400_BAD_REQUEST, msg="An image file is required.")
+
+            serializer = ProductSerializer(product, data={'image': image}, partial=True, context={'request': request})
+            if serializer.is_valid():
+                serializer.save()
+                return echo(status=status.HTTP_200_OK, msg="Product image updated successfully.", data=serializer.data)
+            return echo(status=status.HTTP_400_BAD_REQUEST, msg="Validation failed.", data=serializer.errors)
+        except Http404:
+            return echo(status=status.HTTP_404_NOT_FOUND, msg="Product not found.")
+        except ParseError as e:
+            return echo(status=status.HTTP_400_BAD_REQUEST, msg="Invalid multipart data.", data=str(e))
+        except UnsupportedMediaType as e:
+            return echo(status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, msg="Send the image as multipart/form-data.", data=str(e))
+        except Exception as e:
+            logger.exception(f"Error in ProductImageAPIView: {str(e)}")
+            return echo(status=status.HTTP_500_INTERNAL_SERVER_ERROR, msg="An unexpected error occurred.")
+
+
 class ProductWithoutAuthAPIView(APIView):
     permission_classes = []  # No permissions required
     authentication_classes = []  # No authentication required
 
+    @cache_catalogue_listing
     def get(self, request, product_id=None):
         try:
             if product_id:
@@ -185,31 +264,60 @@ class ProductWithoutAuthAPIView(APIView):
                 radius = float(request.GET.get('radius', 50))  # Default radius: 50 km
 
                 if query:
-                    products = products.filter(title__icontains=query)
+                    # Ranked full-text search over title, description, category and location
+                    products = products.search(query)
 
                 if category:
                     products = products.filter(category=category)
 
+                fieldset = Fieldset.from_request(request)
+                products = setup_eager_loading(products, ProductSerializer, fieldset)
+                # Listings embed the product's creator, which has no `updated_at`
+                version = catalogue_version()
+
                 if lat and lng:
                     try:
                         lat, lng = float(lat), float(lng)
-                        products = [
-                            product for product in products 
-                            if self.calculate_distance(lat, lng, float(product.lat), float(product.lng)) <= radius
-                        ]
+                        # Bounding-box prefilter on the (lat, lng) index, ordered by distance
+                        products = filter_by_radius(products, lat, lng, radius)
                     except ValueError:
                         return echo(
                             status=status.HTTP_400_BAD_REQUEST,
                             msg="Invalid latitude or longitude format."
                         )
+                    # Validators of the products within the radius, which are loaded already
+                    validators = ListingValidators.for_rows(request, products, private=False, version=version)
+                else:
+                    validators = ListingValidators.for_queryset(request, products, private=False, version=version)
+
+                # 304 without serializing when the client's copy of the listing is current
+                not_modified = validators.not_modified(request)
+                if not_modified:
+                    return not_modified
+
+                if not (lat and lng):
+                    # Radius and search results are ordered by distance / relevance, so only the
+                    # plain listing is cursor-paged
+                    paginator = KeysetPagination()
+                    if not query and paginator.is_requested(request):
+                        try:
+                            page = paginator.paginate_queryset(products, request)
+                        except ValueError as e:
+                            return echo(status=status.HTTP_400_BAD_REQUEST, msg=str(e))
+                        data = fast_serialize(ProductSerializer, page, many=True, context={'request': request}, fieldset=fieldset)
+                        return validators.apply(echo(
+                            status=status.HTTP_200_OK,
+                            msg="Success",
+                            data=paginator.get_paginated_data(data)
+                        ))
 
                 # Serialize the filtered products
-                serializer = ProductSerializer(products, many=True, context={'request': request})
-                return echo(
+                data = fast_serialize(ProductSerializer, products, many=True, context={'request': request}, fieldset=fieldset)
+                return validators.apply(echo(
                     status=status.HTTP_200_OK,
                     msg="Success",
-                    data=serializer.data
-                )
+                    data=data
+                ))
 
         except Exception as e:
             logger.exception(f"An error occurred: {e}")
@@ -221,58 +329,119 @@ class ProductWithoutAuthAPIView(APIView):
 
     # Helper function to calculate distance (Haversine formula)
     def calculate_distance(self, lat1, lon1, lat2, lon2):
-        from math import radians, cos, sin, sqrt, atan2
-        earth_radius = 6371  # Radius of Earth in kilometers
-        d_lat = radians(lat2 - lat1)
-        d_lon = radians(lon2 - lon1)
-        a = sin(d_lat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(d_lon / 2) ** 2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-        return earth_radius * c  # Distance in kilometers
+        return haversine(lat1, lon1, lat2, lon2)  # Distance in kilometers
 
 
-class ReWriteDescriptionAPIView(APIView):
+class CatalogueCacheStatsAPIView(APIView):
+    permission_classes, authentication_classes = [], []
+
     @token_auth_required
-    def post(self, request):
-        """Rewrite a product description using ChatGPT."""
-        title = request.data.get("title", "").strip()
-        category = request.data.get("category", "").strip()
+    def get(self, request):
+        """Hit rate, latency and size of the public product listing cache."""
+        return echo(status=status.HTTP_200_OK, msg=Messages.SUCCESS, data=catalogue_cache.stats())
+
+
+class ReWriteDescriptionAPIView(View):
+    """
+    Rewrite a product description using ChatGPT, served natively by the ASGI application.
+
+    Titles already rewritten are answered from the cache (api.rewrite). Others are
+    queued as a job (api.jobs), so every upstream call goes through the job workers and
+    their cap; this request waits on the event loop for up to REWRITE_TIMEOUT seconds,
+    then answers 504 with the job id to poll. With `"mode": "job"` the response is a 202
+    with the job id at once; a `product_id` has the result written onto that product as well.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Authenticated with the access token, like the (CSRF-exempt) DRF views
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    @async_token_auth_required
+    async def post(self, request):
+        try:
+            body = json.loads(request.body or b'{}') if request.content_type == 'application/json' else request.POST
+            title = str(body.get("title") or "").strip()
+            category = str(body.get("category") or "").strip()
+        except (ValueError, AttributeError):
+            return echo_json(status=status.HTTP_400_BAD_REQUEST, msg="Invalid JSON body.")
 
         if not title or not category:
-            return echo(
+            return echo_json(
                 status=status.HTTP_400_BAD_REQUEST,
                 msg="Both title and category are required."
             )
 
-        # Create a combined description
-        desc = f"""
-        Analyze the following waste: "{title}". Provide the following details:
-        1. What type of waste is it?
-        2. What can it be repurposed or made into?
-        3. How should it be disposed of properly (recycled, composted, or other)?
-        """
+        if (body.get("mode") or request.GET.get("mode")) == "job":
+            return await self.submit(request, body, title, category)
 
         try:
-            completion = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "developer", 
-                    "content": "You are an AI assistant specializing in waste management and environmental sustainability. Your task is to analyze waste descriptions and provide recommendations for repurposing or disposal."
-                 },
-                {"role": "user", "content": desc}
-            ]
-            )
-            return echo(
+            improved_desc = await rewriter.lookup(title, category)
+            cached = improved_desc is not None
+            if not cached:
+                job = await sync_to_async(submit_job)(request.user.id, title, category)
+                job = await wait_for_job(job.id, getattr(settings, 'REWRITE_TIMEOUT', 30)) or job
+                if job.status != 'done':
+                    return self.unfinished(request, job)
+                improved_desc = job.result
+            return echo_json(
                 status=status.HTTP_200_OK,
                 msg="Description rewritten successfully.",
                 data={
-                    "original_desc": desc,
-                    "improved_desc": completion.choices[0].message.content
+                    "original_desc": build_prompt(title),
+                    "improved_desc": improved_desc,
+                    "cached": cached,
                 }
             )
-       
+        except ValueError as e:
+            return echo_json(status=status.HTTP_400_BAD_REQUEST, msg=str(e))
         except Exception as e:
-            return echo(
+            logger.exception(f"Error in ReWriteDescriptionAPIView: {str(e)}")
+            return echo_json(
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 msg="An unexpected error occurred.",
                 data={"error": str(e)}
             )
+
+    def unfinished(self, request, job):
+        data = serialize_job(job)
+        if job.status == 'failed':
+            return echo_json(status=status.HTTP_502_BAD_GATEWAY, msg="The rewrite failed.", data=data)
+        # Still queued or running: the client can keep polling for it
+        data["status_url"] = request.build_absolute_uri(reverse('rewrite-description-job', args=[job.id]))
+        return echo_json(status=status.HTTP_504_GATEWAY_TIMEOUT, msg="The rewrite took too long.", data=data)
+
+    async def submit(self, request, body, title, category):
+        """Queue the rewrite as a job and answer at once with the id to poll."""
+        product_id = body.get("product_id")
+        if product_id is not None:
+            try:
+                product_id = int(product_id)
+            except (TypeError, ValueError):
+                return echo_json(status=status.HTTP_400_BAD_REQUEST, msg="Invalid product ID.")
+            if not await Product.objects.filter(id=product_id, created_by_id=request.user.id).aexists():
+                return echo_json(status=status.HTTP_404_NOT_FOUND, msg="Product not found.")
+
+        try:
+            job = await sync_to_async(submit_job)(request.user.id, title, category, product_id)
+        except ValueError as e:
+            return echo_json(status=status.HTTP_400_BAD_REQUEST, msg=str(e))
+        except Exception as e:
+            logger.exception(f"Error queueing rewrite job: {str(e)}")
+            return echo_json(status=status.HTTP_500_INTERNAL_SERVER_ERROR, msg="An unexpected error occurred.")
+
+        data = serialize_job(job)
+        data["status_url"] = request.build_absolute_uri(reverse('rewrite-description-job', args=[job.id]))
+        return echo_json(status=status.HTTP_202_ACCEPTED, msg="Rewrite queued.", data=data)
+
+
+class RewriteJobAPIView(APIView):
+    """Poll a rewrite job queued with `"mode": "job"`; done jobs carry the rewritten description."""
+    permission_classes, authentication_classes = [], []
+
+    @token_auth_required
+    def get(self, request, job_id):
+        job = get_job_backend().get(job_id)
+        if job is None or job.user_id != request.user.id:
+            return echo(status=status.HTTP_404_NOT_FOUND, msg="Job not found.")
+        return echo(status=status.HTTP_200_OK, msg="Success", data=serialize_job(job))
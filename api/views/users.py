@@ -3,12 +3,15 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.exceptions import ParseError, UnsupportedMediaType
+from rest_framework.parsers import MultiPartParser
 from api.serializers import UserSerializer,UserActivitySerializer
 from orm.models import User
 from _applibs.response import echo, Messages
-from datetime import timedelta
 from django.utils.timezone import now
 from ..decorators import token_auth_required
+from ..presence import presence, is_recent
+from ..uploads import accept_image_uploads, request_data
 from django.db import transaction
 logger = logging.getLogger(__name__)
 
@@ -66,7 +69,11 @@ class UserAPIView(APIView):
     def put(self, request, user_id=None):
         try:
             user = User.objects.get(pk=user_id)
-            serializer = UserSerializer(user, data=request.data,partial=True)
+            uploads = accept_image_uploads(request, ['profile_picture'])
+            data = request_data(request)
+            if uploads.errors:
+                return echo(status=status.HTTP_400_BAD_REQUEST, msg=Messages.INVALID_DATA, data=uploads.errors)
+            serializer = UserSerializer(user, data=data,partial=True)
             if serializer.is_valid():
                 serializer.save()
                 return echo(status=status.HTTP_200_OK, msg=Messages.SUCCESS, data=serializer.data)
@@ -92,6 +99,41 @@ class UserAPIView(APIView):
 
 
 
+class UserProfilePictureAPIView(APIView):
+    """Replace the signed-in user's profile picture with a multipart upload, streamed to disk."""
+    permission_classes, authentication_classes = [], []
+    parser_classes = [MultiPartParser]
+
+    @token_auth_required
+    def put(self, request, user_id):
+        try:
+            if request.user.id != user_id:
+                return echo(status=status.HTTP_403_FORBIDDEN, msg="You can only change your own profile picture.")
+            user = User.objects.get(pk=user_id)
+
+            uploads = accept_image_uploads(request, ['profile_picture'])
+            picture = request.data.get('profile_picture')
+            if uploads.errors:
+                return echo(status=status.HTTP_400_BAD_REQUEST, msg=Messages.INVALID_DATA, data=uploads.errors)
+            if picture is None:
+                return echo(status=status.HTTP_400_BAD_REQUEST, msg="An image file is required.")
+
+            serializer = UserSerializer(user, data={'profile_picture': picture}, partial=True, context={'request': request})
+            if serializer.is_valid():
+                serializer.save()
+                return echo(status=status.HTTP_200_OK, msg=Messages.SUCCESS, data=serializer.data)
+            return echo(status=status.HTTP_400_BAD_REQUEST, msg=Messages.INVALID_DATA, data=serializer.errors)
+        except User.DoesNotExist:
+            return echo(status=404, msg=Messages.NF)
+        except ParseError as e:
+            return echo(status=status.HTTP_400_BAD_REQUEST, msg=Messages.INVALID_DATA, data=str(e))
+        except UnsupportedMediaType as e:
+            return echo(status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, msg="Send the image as multipart/form-data.", data=str(e))
+        except Exception as e:
+            logger.exception(e)
+            return echo(status=status.HTTP_400_BAD_REQUEST, msg=Messages.EXCEPTION)
+
+
 class CheckUserActiveStatusAPIView(APIView):
     @token_auth_required
     def post(self, request):
@@ -104,49 +146,76 @@ class CheckUserActiveStatusAPIView(APIView):
                 msg="User ID is required"
             )
 
-        try:
-            # Fetch the user by ID
-            user = User.objects.get(id=user_id)
-
-            # Check if the user is active based on the `last_active` timestamp
-            is_active = (
-                user.last_active is not None and 
-                (now() - user.last_active) <= timedelta(seconds=30)
-            )
-
-            # Return the active status without modifying the database
-            return echo(
-                status=status.HTTP_200_OK,
-                msg="User status retrieved successfully",
-                data={
-                    "is_active": is_active
-                }
-            )
-
-        except User.DoesNotExist:
+        # Check if the user is active based on the presence store (falls back to `last_active`)
+        statuses = presence.is_active_many([int(user_id)])
+        if int(user_id) not in statuses:
             return echo(
                 status=status.HTTP_404_NOT_FOUND,
                 msg="User not found"
             )
+
+        # Return the active status without modifying the database
+        return echo(
+            status=status.HTTP_200_OK,
+            msg="User status retrieved successfully",
+            data={
+                "is_active": statuses[int(user_id)]
+            }
+        )
         
+class CheckUsersActiveStatusAPIView(APIView):
+    max_user_ids = 200
+
+    @token_auth_required
+    def post(self, request):
+        """Check the active status of many users in one round trip."""
+        user_ids = request.data.get('user_ids')
+
+        if not isinstance(user_ids, list) or not user_ids:
+            return echo(status=status.HTTP_400_BAD_REQUEST, msg="A list of user IDs is required")
+        if len(user_ids) > self.max_user_ids:
+            return echo(status=status.HTTP_400_BAD_REQUEST, msg=f"At most {self.max_user_ids} user IDs are allowed")
+
+        try:
+            user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+        except (TypeError, ValueError):
+            return echo(status=status.HTTP_400_BAD_REQUEST, msg=Messages.INVALID_PARAMETERS)
+
+        # One presence lookup (a single `id__in` query); unknown ids are left out
+        last_seen = presence.last_seen_many(user_ids)
+        at = now()
+
+        return echo(
+            status=status.HTTP_200_OK,
+            msg="User statuses retrieved successfully",
+            data=[
+                {
+                    "id": user_id,
+                    "is_active": is_recent(last_seen[user_id], at),
+                    "last_active": last_seen[user_id],
+                }
+                for user_id in user_ids if user_id in last_seen
+            ]
+        )
+
 class UpdateUserLastActiveAPIView(APIView):
     @token_auth_required
     def post(self, request):
-        """Update the user's last active time and mark as active."""
+        """
+        Update the user's last active time and mark as active.
+
+        The heartbeat doesn't read the user's row, so there is no 404: a user deleted since
+        the token decorator resolved them is left out of the next flush's bulk_update.
+        """
         user_id = request.user.id
         if not user_id:
             return echo(status=status.HTTP_400_BAD_REQUEST, msg="User ID is required")
 
-        try:
-            user = User.objects.get(id=user_id)
-            user.is_active_user = True
-            user.last_active = now()
-            user.save()
-
-            return echo(status=status.HTTP_200_OK, msg="User last active time updated successfully", data={
-                "id": user.id,
-                "is_active_user": user.is_active_user,
-                "last_active": user.last_active
-            })
-        except User.DoesNotExist:
-            return echo(status=status.HTTP_404_NOT_FOUND, msg="User not found")
\ No newline at end of file
+        # Heartbeats go to the presence store, which flushes them to the database in batches
+        last_active = presence.touch(user_id)
+
+        return echo(status=status.HTTP_200_OK, msg="User last active time updated successfully", data={
+            "id": user_id,
+            "is_active_user": True,
+            "last_active": last_active
+        })
@@ -0,0 +1,131 @@
+"""
+Full-text search over Product.title, description, category and location.
+
+MySQL uses a FULLTEXT index queried in boolean mode; SQLite (local runs) uses an FTS5
+table kept in sync by triggers. Both are created by migration 0011. Other databases,
+or an SQLite build without FTS5, fall back to icontains matching with a simple score.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+SEARCH_FIELDS = ('title', 'description', 'category', 'location')
+FIELD_WEIGHTS = {'title': 10, 'description': 2, 'category': 1, 'location': 1}
+MAX_TOKENS = 8
+
+MYSQL_INDEX = 'product_search_ft'
+FTS_TABLE = 'orm_product_fts'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_fts_available = {}
+
+
+def tokenize(query):
+    """Lowercased word tokens of a search query, at most MAX_TOKENS of them."""
+    return _TOKEN_RE.findall((query or '').lower())[:MAX_TOKENS]
+
+
+def install(connection):
+    """Create the full-text index for the connection's database, if it has one."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                f"ALTER TABLE orm_product ADD FULLTEXT INDEX {MYSQL_INDEX} ({', '.join(SEARCH_FIELDS)})"
+            )
+        elif connection.vendor == 'sqlite':
+            columns = ', '.join(SEARCH_FIELDS)
+            new_values = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+            old_values = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({columns}, "
+                f"content='orm_product', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON orm_product BEGIN "
+                f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON orm_product BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON orm_product BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    _fts_available.pop(connection.alias, None)
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(f"ALTER TABLE orm_product DROP INDEX {MYSQL_INDEX}")
+        elif connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _fts_available.pop(connection.alias, None)
+
+
+def backend(connection):
+    """'mysql', 'fts5' or 'icontains': how the connection's database is searched."""
+    if connection.vendor == 'mysql':
+        return 'mysql'
+    if connection.vendor == 'sqlite':
+        if connection.alias not in _fts_available:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                _fts_available[connection.alias] = cursor.fetchone() is not None
+        if _fts_available[connection.alias]:
+            return 'fts5'
+    return 'icontains'
+
+
+def search(queryset, query, using_backend=None):
+    """
+    Filter the product queryset to the matches of `query`, annotated with a
+    `search_rank` (higher is better) and ordered by it, newest first among ties.
+
+    Every token must match one of the fields, as a word or a word prefix, so partial
+    words typed by the user already find results.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+
+    using_backend = using_backend or backend(connections[queryset.db])
+    if using_backend == 'mysql':
+        table = queryset.model._meta.db_table
+        terms = ' '.join(f'+{token}*' for token in tokens)
+        match = f"MATCH ({', '.join(f'{table}.{field}' for field in SEARCH_FIELDS)}) AGAINST (%s IN BOOLEAN MODE)"
+        queryset = queryset.annotate(search_rank=RawSQL(match, [terms])).filter(search_rank__gt=0)
+    elif using_backend == 'fts5':
+        table = queryset.model._meta.db_table
+        terms = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(float(FIELD_WEIGHTS[field])) for field in SEARCH_FIELDS)
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[terms],
+            # bm25 is lower for better matches
+            select={'search_rank': f'-bm25({FTS_TABLE}, {weights})'},
+        )
+    else:
+        score = Value(0)
+        for token in tokens:
+            match_any = Q()
+            for field in SEARCH_FIELDS:
+                match_any |= Q(**{f'{field}__icontains': token})
+                score = score + Case(
+                    When(**{f'{field}__icontains': token}, then=Value(FIELD_WEIGHTS[field])),
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+            queryset = queryset.filter(match_any)
+        queryset = queryset.annotate(search_rank=score)
+
+    return queryset.order_by('-search_rank', '-created_at', '-id')
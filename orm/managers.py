@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import IntegrityError, models
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 class UserManager(models.Manager):
@@ -9,3 +12,127 @@ class UserManager(models.Manager):
     def get_all_users(self):
         return self.all()
 
+
+class ProductQuerySet(models.QuerySet):
+
+    def search(self, query):
+        """Ranked full-text search over title, description, category and location (see orm.fulltext)."""
+        from orm import fulltext
+        return fulltext.search(self, query)
+
+
+class ConversationManager(models.Manager):
+
+    def inbox_for(self, user):
+        """
+        Conversations annotated with the latest message content and the unread count for `user`,
+        with both participants joined in, so the inbox serializes without per-row queries.
+        """
+        Message = self.model._meta.get_field('messages').related_model
+
+        latest_message = Message.objects.filter(
+            conversation=OuterRef('pk')
+        ).order_by('-created_at', '-id').values('content')[:1]
+
+        unread_messages = Message.objects.filter(
+            conversation=OuterRef('pk'), recipient_id=user.id, is_read=False
+        ).order_by().values('conversation').annotate(total=Count('id')).values('total')
+
+        return self.select_related('user1', 'user2').annotate(
+            latest_message_text=Coalesce(Subquery(latest_message), Value(''), output_field=models.TextField()),
+            unread_count=Coalesce(Subquery(unread_messages), Value(0), output_field=models.IntegerField()),
+        )
+
+
+class ConversationSummaryManager(models.Manager):
+    """Keeps one summary row per conversation participant in step with the messages table."""
+
+    def ensure_for(self, conversation):
+        """Create the (empty) summary rows of a new conversation."""
+        for user_id in {conversation.user1_id, conversation.user2_id} - {None}:
+            self.get_or_create(conversation_id=conversation.id, user_id=user_id)
+
+    def record_message(self, message):
+        """Point both participants' rows at `message` and bump the recipient's unread count."""
+        last_message = {
+            'last_message_id': message.id,
+            'last_message_content': message.content or '',
+            'last_message_at': message.created_at,
+        }
+        for user_id, unread in ((message.sender_id, 0), (message.recipient_id, 1)):
+            if user_id is None:
+                continue
+            updated = self.filter(conversation_id=message.conversation_id, user_id=user_id).update(
+                unread_count=F('unread_count') + unread, **last_message
+            )
+            if updated:
+                continue
+            try:
+                with transaction.atomic():
+                    self.create(
+                        conversation_id=message.conversation_id, user_id=user_id,
+                        unread_count=self._count_unread(message.conversation_id, user_id), **last_message
+                    )
+            except IntegrityError:
+                # A concurrent first message created the row since the update above
+                self.filter(conversation_id=message.conversation_id, user_id=user_id).update(
+                    unread_count=F('unread_count') + unread, **last_message
+                )
+
+    def mark_read(self, conversation_id, user_id):
+        """Resync the user's unread count after their messages were marked as read."""
+        self.filter(conversation_id=conversation_id, user_id=user_id).update(
+            unread_count=self._count_unread(conversation_id, user_id)
+        )
+
+    def rebuild(self):
+        """Recompute every summary row from the conversations and messages tables."""
+        return rebuild_conversation_summaries(self.model)
+
+    def _count_unread(self, conversation_id, user_id):
+        Message = self.model._meta.get_field('last_message').related_model
+        return Message.objects.filter(conversation_id=conversation_id, recipient_id=user_id, is_read=False).count()
+
+
+def rebuild_conversation_summaries(ConversationSummary):
+    """
+    Recompute every summary row from the conversations and messages tables. Takes the
+    model so the 0015 data migration can run it on its historical models.
+    """
+    Conversation = ConversationSummary._meta.get_field('conversation').related_model
+    Message = ConversationSummary._meta.get_field('last_message').related_model
+
+    latest_message = Message.objects.filter(
+        conversation=OuterRef('pk')
+    ).order_by('-created_at', '-id').values('id')[:1]
+    conversations = list(
+        Conversation.objects.annotate(last_message_id=Subquery(latest_message))
+        .values('id', 'user1_id', 'user2_id', 'last_message_id')
+    )
+
+    messages = Message.objects.in_bulk(
+        [row['last_message_id'] for row in conversations if row['last_message_id']]
+    )
+    unread = {
+        (row['conversation_id'], row['recipient_id']): row['total']
+        for row in Message.objects.filter(is_read=False).order_by()
+        .values('conversation_id', 'recipient_id').annotate(total=Count('id'))
+    }
+
+    summaries = []
+    for row in conversations:
+        message = messages.get(row['last_message_id'])
+        for user_id in {row['user1_id'], row['user2_id']} - {None}:
+            summaries.append(ConversationSummary(
+                conversation_id=row['id'],
+                user_id=user_id,
+                last_message=message,
+                last_message_content=(message.content or '') if message else '',
+                last_message_at=message.created_at if message else None,
+                unread_count=unread.get((row['id'], user_id), 0),
+            ))
+
+    with transaction.atomic():
+        ConversationSummary._default_manager.all().delete()
+        ConversationSummary._default_manager.bulk_create(summaries, batch_size=1000)
+    return len(summaries)
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orm', '0005_order_seller'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['lat', 'lng'], name='product_lat_lng_idx'),
+        ),
+    ]
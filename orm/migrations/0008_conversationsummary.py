@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orm', '0007_product_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_content', models.TextField(blank=True, default='')),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='orm.conversation')),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='orm.message')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_summaries', to='orm.user')),
+            ],
+            options={
+                'verbose_name': 'Conversation summary',
+                'verbose_name_plural': 'Conversation summaries',
+                'indexes': [models.Index(fields=['user', '-last_message_at'], name='summary_user_latest_idx')],
+                'constraints': [models.UniqueConstraint(fields=('conversation', 'user'), name='unique_conversation_summary')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+from orm import fulltext
+
+
+def create_search_index(apps, schema_editor):
+    try:
+        fulltext.install(schema_editor.connection)
+    except OperationalError:
+        # SQLite built without FTS5: searches fall back to icontains
+        if schema_editor.connection.vendor != 'sqlite':
+            raise
+
+
+def drop_search_index(apps, schema_editor):
+    fulltext.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orm', '0010_revokedtoken'),
+    ]
+
+    operations = [
+        # MySQL FULLTEXT index or SQLite FTS5 table over title, description, category and location
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orm', '0012_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DescriptionRewrite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('title', models.CharField(max_length=255)),
+                ('category', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=100)),
+                ('content', models.TextField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Description rewrite',
+                'verbose_name_plural': 'Description rewrites',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:39
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orm', '0013_descriptionrewrite'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RewriteJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('category', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('result', models.TextField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='orm.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rewrite_jobs', to='orm.user')),
+            ],
+            options={
+                'verbose_name': 'Rewrite job',
+                'verbose_name_plural': 'Rewrite jobs',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='rewrite_job_status_idx')],
+            },
+        ),
+    ]
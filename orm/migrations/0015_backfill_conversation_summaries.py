@@ -0,0 +1,20 @@
+from django.db import migrations
+
+from orm.managers import rebuild_conversation_summaries
+
+
+def backfill_summaries(apps, schema_editor):
+    # The inbox reads only ConversationSummary; fill it in for conversations that
+    # predate 0008 (the rebuild_conversation_summaries command does the same)
+    rebuild_conversation_summaries(apps.get_model('orm', 'ConversationSummary'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orm', '0014_rewritejob'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    # The row api.catalogue bumps; created up front so two first bumps can't race
+    apps.get_model('orm', 'CatalogueVersion').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orm', '0015_backfill_conversation_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Catalogue version',
+                'verbose_name_plural': 'Catalogue versions',
+            },
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
+import uuid
 from django.db import models
 from django.utils.timezone import now
-from orm.managers import UserManager
+from orm.managers import UserManager, ConversationManager, ConversationSummaryManager, ProductQuerySet
 from django.dispatch import receiver
 from datetime import  timedelta
 
@@ -15,6 +16,7 @@ class User(models.Model):
     remember_token = models.CharField(max_length=100, blank=True, null=True)
     remember_token_created_at = models.DateTimeField(blank=True, null=True)
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    image_variants = models.JSONField(blank=True, null=True, editable=False)  # Written by api.images
     phone_number = models.CharField(max_length=15, blank=True, null=True)
 
     # Address Information
@@ -38,6 +40,32 @@ class User(models.Model):
 
 
 
+class CatalogueVersion(models.Model):
+    """Single-row counter bumped on Product/User changes; public listing cache entries are keyed on it (api.catalogue)."""
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Catalogue version'
+        verbose_name_plural = 'Catalogue versions'
+
+    def __str__(self):
+        return str(self.version)
+
+
+class RevokedToken(models.Model):
+    """Refresh tokens revoked on logout, by JWT id."""
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)  # Reloaded by api.revocation
+
+    class Meta:
+        verbose_name = 'Revoked token'
+        verbose_name_plural = 'Revoked tokens'
+
+    def __str__(self):
+        return self.jti
+
+
 class Product(models.Model):
     CATEGORY_CHOICES = [
         ('chemical', 'Chemical'),
@@ -57,6 +85,7 @@ class Product(models.Model):
 
     title = models.CharField(max_length=255)
     image = models.ImageField(upload_to="product_images/", blank=True, null=True)
+    image_variants = models.JSONField(blank=True, null=True, editable=False)  # Written by api.images
     description = models.TextField(blank=True, null=True)
     lat = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
     lng = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
@@ -70,9 +99,16 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Product"
         verbose_name_plural = "Products"
+        indexes = [
+            models.Index(fields=['lat', 'lng'], name='product_lat_lng_idx'),  # Radius search prefilter
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),  # Cursor paging
+            models.Index(fields=['created_by', '-created_at', '-id'], name='product_owner_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -97,6 +133,10 @@ class Order(models.Model):
     class Meta:
         verbose_name = "Order"
         verbose_name_plural = "Orders"
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),  # Purchases
+            models.Index(fields=['seller', '-created_at', '-id'], name='order_seller_created_idx'),  # Sales
+        ]
 
     def __str__(self):
         return f"Order {self.id} - {self.user}"
@@ -110,6 +150,8 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ConversationManager()
+
     def __str__(self):
         return f"Conversation between {self.user1} and {self.user2}"
 
@@ -157,6 +199,19 @@ class Message(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Chat history page, newest first
+            models.Index(fields=['conversation', '-created_at'], name='message_conv_created_idx'),
+            # Unread messages of a conversation for the recipient (read marking and polling)
+            models.Index(fields=['conversation', 'recipient', 'is_read'], name='message_unread_idx'),
+            # Only the unread rows, where partial indexes are supported (skipped on MySQL)
+            models.Index(
+                fields=['recipient', 'conversation'], condition=models.Q(is_read=False),
+                name='message_unread_partial_idx'
+            ),
+        ]
+
     def __str__(self):
         return f"Message from {self.sender} to {self.recipient}"
     
@@ -188,4 +243,79 @@ class Message(models.Model):
         if hasattr(self, 'attachment') and self.attachment and self.attachment.file_name:
             return f"/uploads/chats/images/{self.attachment.file_name}"
         return ""
-    
\ No newline at end of file
+    
+
+
+class ConversationSummary(models.Model):
+    """Per-participant inbox row: the conversation's latest message and the user's unread count."""
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="summaries")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversation_summaries")
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    last_message_content = models.TextField(blank=True, default='')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ConversationSummaryManager()
+
+    class Meta:
+        verbose_name = "Conversation summary"
+        verbose_name_plural = "Conversation summaries"
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'user'], name='unique_conversation_summary'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-last_message_at'], name='summary_user_latest_idx'),  # Inbox listing
+        ]
+
+    def __str__(self):
+        return f"Summary of {self.conversation_id} for {self.user_id}"
+
+
+class DescriptionRewrite(models.Model):
+    """AI rewrites of product descriptions (api.rewrite), keyed on a hash of the normalized title, category and model."""
+    key = models.CharField(max_length=64, unique=True)
+    title = models.CharField(max_length=255)
+    category = models.CharField(max_length=50)
+    model = models.CharField(max_length=100)
+    content = models.TextField()
+    created_at = models.DateTimeField(default=now)
+
+    class Meta:
+        verbose_name = 'Description rewrite'
+        verbose_name_plural = 'Description rewrites'
+
+    def __str__(self):
+        return self.title
+
+
+class RewriteJob(models.Model):
+    """A queued AI description rewrite (api.jobs.DatabaseJobBackend), polled by its id."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="rewrite_jobs")
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    title = models.CharField(max_length=255)
+    category = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    result = models.TextField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(default=now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Rewrite job'
+        verbose_name_plural = 'Rewrite jobs'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='rewrite_job_status_idx'),  # Claiming the oldest job
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.status})"
@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+Serve the project through this entry point (e.g. uvicorn wastex.asgi:application)
+so async views such as the chat long-poll and description rewrite endpoints park
+on the event loop instead of holding a worker thread. WebSocket connections to
+/ws/chat are handed to the chat socket; every other request goes to Django.
 """
 
 import os
@@ -13,4 +18,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wastex.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since it loads models
+from api.sockets import ChatSocket  # noqa: E402
+
+chat_socket = ChatSocket()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        if scope['path'] == '/ws/chat':
+            return await chat_socket(scope, receive, send)
+        # Unknown socket route: refuse the handshake
+        await receive()
+        return await send({'type': 'websocket.close', 'code': 4404})
+    return await django_application(scope, receive, send)
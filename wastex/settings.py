@@ -40,6 +40,9 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Point the client at another server (e.g. `python manage.py fake_completion_server`)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_REWRITE_MODEL = os.getenv("OPENAI_REWRITE_MODEL", "gpt-4o-mini")
 
 # Application definition
 
@@ -133,6 +136,9 @@ USE_I18N = True
 
 USE_TZ = True
 
+# logs/ is not tracked; create it so the file handler can open its log
+os.makedirs(os.path.join(BASE_DIR, 'logs'), exist_ok=True)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -181,6 +187,82 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# MySQL does not support partial indexes; the conditional Message index is only created elsewhere
+SILENCED_SYSTEM_CHECKS = ['models.W037']
+
+# Upper bound for the `page_size` query parameter of cursor-paginated listings
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", 100))
+
+# Longest time (seconds) a long-poll request is parked waiting for new messages
+LONG_POLL_TIMEOUT = float(os.getenv("LONG_POLL_TIMEOUT", 25))
+
+# Pub/sub backend fanning chat events out to long-poll requests and WebSockets
+# (see api.notifications.BaseBroker for the interface a cross-worker backend implements)
+CHAT_BROKER_BACKEND = os.getenv("CHAT_BROKER_BACKEND", "api.notifications.InMemoryBroker")
+
+# Presence heartbeats: in-memory entries live PRESENCE_TTL seconds and are written to
+# User.last_active by a background thread every PRESENCE_FLUSH_INTERVAL seconds (keep it under 30)
+PRESENCE_MAX_USERS = int(os.getenv("PRESENCE_MAX_USERS", 100000))
+PRESENCE_TTL = int(os.getenv("PRESENCE_TTL", 300))
+PRESENCE_FLUSH_INTERVAL = int(os.getenv("PRESENCE_FLUSH_INTERVAL", 10))
+
+# Authenticated users cached per process by the token decorators; entries are dropped on
+# User save/delete (by other workers too, through the catalogue version) and otherwise
+# expire after PRINCIPAL_CACHE_TTL seconds
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+
+# Access tokens whose signature was already verified, trusted until their own `exp`
+VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv("VERIFIED_TOKEN_CACHE_SIZE", 10000))
+
+# How often (seconds) each worker picks up refresh tokens revoked by other workers, and how
+# far back (seconds) each reload looks again for revocations that committed late
+REVOKED_TOKENS_RELOAD_INTERVAL = int(os.getenv("REVOKED_TOKENS_RELOAD_INTERVAL", 60))
+REVOKED_TOKENS_RELOAD_OVERLAP = int(os.getenv("REVOKED_TOKENS_RELOAD_OVERLAP", 300))
+
+# Rendered public product listings, shared by callers with the same parameters (radius
+# listings by callers at the same position); Product/User changes invalidate entries
+# through a version kept in the database, which each worker re-reads at most every
+# CATALOGUE_VERSION_RELOAD_INTERVAL seconds
+CATALOGUE_CACHE_MAX_BYTES = int(os.getenv("CATALOGUE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CATALOGUE_CACHE_TTL = int(os.getenv("CATALOGUE_CACHE_TTL", 300))
+CATALOGUE_VERSION_RELOAD_INTERVAL = float(os.getenv("CATALOGUE_VERSION_RELOAD_INTERVAL", 1))
+
+# Uploaded product and profile images get WebP and JPEG variants, resized to fit these
+# sizes (longest side, pixels), generated by IMAGE_PIPELINE_WORKERS background threads
+IMAGE_VARIANT_SIZES = {'thumb': 320, 'medium': 960}
+IMAGE_PIPELINE_WORKERS = int(os.getenv("IMAGE_PIPELINE_WORKERS", 2))
+
+# Largest image accepted by the streaming multipart upload endpoints
+IMAGE_UPLOAD_MAX_BYTES = int(os.getenv("IMAGE_UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+
+# /media/ and /static/ files (api.media.serve). With MEDIA_SENDFILE_BACKEND set to
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd) the front server sends
+# the file; nginx needs an `internal` location at MEDIA_ACCEL_REDIRECT_LOCATION aliased
+# to BASE_DIR. Files without a unique name are cached MEDIA_CACHE_MAX_AGE seconds
+MEDIA_SENDFILE_BACKEND = os.getenv("MEDIA_SENDFILE_BACKEND") or None
+MEDIA_ACCEL_REDIRECT_LOCATION = os.getenv("MEDIA_ACCEL_REDIRECT_LOCATION", "/_protected/")
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", 3600))
+
+# AI description rewrites (api.rewrite): at most REWRITE_MAX_CONCURRENCY upstream calls
+# at once per process, each abandoned after REWRITE_TIMEOUT seconds. Answers are cached
+# in the database for REWRITE_CACHE_MAX_AGE seconds (0 keeps them forever)
+REWRITE_MAX_CONCURRENCY = int(os.getenv("REWRITE_MAX_CONCURRENCY", 8))
+REWRITE_TIMEOUT = float(os.getenv("REWRITE_TIMEOUT", 30))
+REWRITE_CACHE_MAX_AGE = int(os.getenv("REWRITE_CACHE_MAX_AGE", 30 * 24 * 60 * 60))
+
+# Rewrites that miss the cache run as jobs (api.jobs), polled by `"mode": "job"` clients
+# and awaited by the others. Each web process works them off with REWRITE_JOB_WORKERS
+# threads, a cap on its own upstream calls. For one cap across every process, use
+# api.jobs.DatabaseJobBackend (which shares the jobs between processes), set
+# REWRITE_JOB_WORKERS to 0 and run `manage.py run_rewrite_jobs --workers <cap>` next to
+# the web processes; api.jobs.InMemoryJobBackend keeps the jobs in the process
+REWRITE_JOB_BACKEND = os.getenv("REWRITE_JOB_BACKEND", "api.jobs.DatabaseJobBackend")
+REWRITE_JOB_WORKERS = int(os.getenv("REWRITE_JOB_WORKERS", REWRITE_MAX_CONCURRENCY))
+REWRITE_JOB_POLL_INTERVAL = float(os.getenv("REWRITE_JOB_POLL_INTERVAL", 1))
+REWRITE_JOB_STALE_AFTER = int(os.getenv("REWRITE_JOB_STALE_AFTER", 300))
+REWRITE_JOB_TTL = int(os.getenv("REWRITE_JOB_TTL", 24 * 60 * 60))
+
 
 ALLOWED_HOSTS = str(os.getenv("ALLOWED_HOSTS")).split(",")
 CSRF_TRUSTED_ORIGINS = str(os.getenv("CSRF_TRUSTED_ORIGINS")).split(",")
@@ -198,10 +280,28 @@ CORS_ALLOW_HEADERS = [
 ]
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Access tokens refreshed by token_auth_required are also returned in this header
+CORS_EXPOSE_HEADERS = ['X-Access-Token', 'X-Cache']
+
 CORS_ALLOWED_ORIGINS = [
-    'http://localhost:5173', 
+    'http://localhost:5173',
 ]
 
+# Pages allowed to open /ws/chat. Browsers send the `access` cookie with any page's
+# handshake, so sockets from other origins are refused (CORS does not apply to them)
+CHAT_SOCKET_ALLOWED_ORIGINS = [
+    origin for origin in os.getenv("CHAT_SOCKET_ALLOWED_ORIGINS", "").split(",") if origin
+] or CSRF_TRUSTED_ORIGINS + CORS_ALLOWED_ORIGINS
+
+REST_FRAMEWORK = {
+    # FastJSONRenderer encodes with orjson when installed; swap back to
+    # rest_framework.renderers.JSONRenderer to use the stdlib encoder
+    'DEFAULT_RENDERER_CLASSES': [
+        '_applibs.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
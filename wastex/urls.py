@@ -17,12 +17,12 @@ Including another URLconf
 from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include, re_path
-from django.views.static import serve
+from api.media import serve
 
 urlpatterns = [
-    re_path(settings.STATIC_URL[1:] + r"(?P<path>.*)$", serve, {"document_root": settings.STATIC_ROOT}),
+    re_path(settings.STATIC_URL[1:] + r"(?P<path>.*)$", serve, {"document_root": settings.STATIC_ROOT, "url_prefix": settings.STATIC_URL.lstrip('/')}),
     path("admin/", admin.site.urls),
     path("api/", include('api.urls')),
-    path('media/<path:path>', serve, {'document_root': settings.MEDIA_ROOT}),
+    path('media/<path:path>', serve, {'document_root': settings.MEDIA_ROOT, 'url_prefix': settings.MEDIA_URL.lstrip('/')}),
 
 ]